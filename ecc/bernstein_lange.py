@@ -0,0 +1,157 @@
+import mmap
+import struct
+from hashlib import sha256
+from random import randrange
+from tempfile import TemporaryDirectory
+
+from ec import ec_curve
+from pollard_kangaroo import JumpTable
+from utils import introot
+
+# header - magic, width, dp bits, jumps, entries, bytes per log, curve digest
+HEADER = struct.Struct("<8s16sQQQQ32s")
+MAGIC = b"ECCBLTAB"
+FP_MASK = (1 << 64) - 1
+
+
+def jump_mean(width, dp_bits):
+	# Trails of 2^dp_bits jumps from W^(1/3) random starts, so that every
+	# log in [0, W) is crossed by about four trails
+	return max(1, width >> (2 * dp_bits) << 2)
+
+
+def curve_digest(curve, G):
+	return sha256(f"{curve.a} {curve.b} {curve.p} {G.x} {G.y}".encode()).digest()
+
+
+class TameTable:
+	# Bernstein-Lange precomputation for interval DLPs of width W. Tame walks
+	# start at random logs in [0, W) and stop at distinguished points, the
+	# table keeps one (x fingerprint, log) entry per distinguished point,
+	# sorted by fingerprint. With about W^(1/3) entries, walks of about
+	# W^(1/3) steps and jumps of about 4*W^(1/3), a query needs O(W^(1/3))
+	# additions. Walks only depend on (curve, G, W), so one table serves
+	# every query against that base point.
+	def __init__(self, curve, G, width, dp_bits, jumps, data, log_size):
+		self.curve = curve
+		self.G = curve.to_affine(G)
+		self.width = width
+		self.dp_bits = dp_bits
+		self.dp_mask = (1 << dp_bits) - 1
+		self.jumps = JumpTable(curve, G, 0, width, mean=jump_mean(width, dp_bits))
+		assert len(self.jumps.dist) == jumps, "jump table does not match the stored table"
+		self.data = data
+		self.log_size = log_size
+		self.entry = struct.Struct(f"<Q{log_size}s")
+		self.count = len(data) // self.entry.size
+
+	@classmethod
+	def build(cls, curve, G, width, size=None, batch=256):
+		# `size` entries, W^(1/3) by default. Distinguished points are about
+		# W^(1/3) apart, so generation costs about W^(2/3) additions.
+		if size is None:
+			size = max(1, introot(width, 3))
+		dp_bits = max(0, (width.bit_length() - 1) // 3)
+		dp_mask = (1 << dp_bits) - 1
+		jumps = JumpTable(curve, G, 0, width, mean=jump_mean(width, dp_bits))
+		max_len = 20 << dp_bits
+		found = {}
+		# wild walks that miss keep going past their first distinguished
+		# point, so tame walks also start up to 8 trail lengths beyond W -
+		# otherwise logs near the top of the interval walk out of coverage
+		reach = width + (jump_mean(width, dp_bits) << (dp_bits + 3))
+
+		def spawn():
+			y = randrange(reach)
+			return [curve.mult(y, G), y, 0]
+
+		# tame walks advance in lockstep, finished or stuck walks are replaced
+		walks = [spawn() for _ in range(min(batch, size))]
+		while len(found) < size:
+			idx = [jumps.index(w[0]) for w in walks]
+			pts = curve.add_many([w[0] for w in walks], [jumps.pts[j] for j in idx])
+			for w, pt, j in zip(walks, pts, idx):
+				w[0], w[1], w[2] = pt, w[1] + jumps.dist[j], w[2] + 1
+				if pt.x & dp_mask == 0:
+					found.setdefault(pt.x & FP_MASK, w[1])
+				if pt.x & dp_mask == 0 or w[2] > max_len:
+					w[:] = spawn()
+		log_size = max(1, (max(found.values()).bit_length() + 7) // 8)
+		entry = struct.Struct(f"<Q{log_size}s")
+		data = b"".join(entry.pack(fp, log.to_bytes(log_size, "little")) for fp, log in sorted(found.items()))
+		return cls(curve, G, width, dp_bits, len(jumps.dist), data, log_size)
+
+	def save(self, path):
+		with open(path, "wb") as f:
+			f.write(
+			    HEADER.pack(MAGIC, self.width.to_bytes(16, "little"), self.dp_bits, len(self.jumps.dist), self.count,
+			                self.log_size, curve_digest(self.curve, self.G)))
+			f.write(self.data)
+
+	@classmethod
+	def load(cls, curve, G, path):
+		# The entries stay on disk and are paged in by the binary search
+		with open(path, "rb") as f:
+			data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, width, dp_bits, jumps, count, log_size, digest = HEADER.unpack_from(data)
+		assert magic == MAGIC, f"{path} is not a tame kangaroo table"
+		assert digest == curve_digest(curve, G), f"{path} was built for a different curve or base point"
+		entries = memoryview(data)[HEADER.size:HEADER.size + count * (8 + log_size)]
+		return cls(curve, G, int.from_bytes(width, "little"), dp_bits, jumps, entries, log_size)
+
+	def lookup(self, pt):
+		fp = pt.x & FP_MASK
+		lo, hi = 0, self.count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.entry.unpack_from(self.data, mid * self.entry.size)[0] < fp:
+				lo = mid + 1
+			else:
+				hi = mid
+		if lo == self.count:
+			return None
+		key, log = self.entry.unpack_from(self.data, lo * self.entry.size)
+		return int.from_bytes(log, "little") if key == fp else None
+
+	def solve(self, F, a, max_walks=1024):
+		# log of F, which has to lie in [a, a + W). Walks restart from fresh
+		# random offsets until one succeeds, None only once max_walks are
+		# used up. For W = 2^24 about 1 in 300 queries needs a second walk.
+		curve = self.curve
+		base = curve.add(F, curve.mult(-a, self.G))
+		max_len = 20 << self.dp_bits
+		for _ in range(max_walks):
+			y = randrange(jump_mean(self.width, self.dp_bits) << 4)
+			pt, dist = curve.add(base, curve.mult(y, self.G)), y
+			for _ in range(max_len):
+				# a distinguished point missing from the table means the walk
+				# crossed a stretch no tame trail covers, it keeps going until
+				# it runs into one further up
+				if pt.x & self.dp_mask == 0:
+					log = self.lookup(pt)
+					if log is not None and curve.mult(a + log - dist, self.G) == F:
+						return a + log - dist
+				j = self.jumps.index(pt)
+				pt, dist = curve.add(pt, self.jumps.pts[j]), dist + self.jumps.dist[j]
+		return None
+
+
+def test_bernstein_lange():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	G = curve(769278016, 752868328)
+	width = 1 << 24
+	with TemporaryDirectory() as tmp:
+		TameTable.build(curve, G, width).save(f"{tmp}/tame.tbl")
+		table = TameTable.load(curve, G, f"{tmp}/tame.tbl")
+		for _ in range(5):
+			lo = randrange(0, p // 2)
+			k = lo + randrange(width)
+			assert table.solve(curve.mult(k, G), lo) == k
+		table.data.release()
+
+
+if __name__ == "__main__":
+	test_bernstein_lange()
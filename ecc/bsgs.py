@@ -1,18 +1,269 @@
+import heapq
 import math
+import mmap
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import islice
 from random import randrange
+from tempfile import TemporaryFile
 
 from ec import ec_curve
+from utils import isqrt, modinv
 
 
-def bsgs(curve, g, f, n):
-	m = math.ceil(math.sqrt(n))
-	baby_step = {curve.multiply(i, g): i for i in range(m)}
-	m_inv = curve.multiply(-m, g)
-	y = f
-	for i in range(m):
-		if y in baby_step:
-			return i * m + baby_step[y]
-		y = curve.add(y, m_inv)
+class CompactTable:
+	# Baby steps i*g as two sorted flat arrays instead of a dict of ec_points,
+	# 32 bit fingerprints of x and the matching i, found by binary search.
+	# That is 8 bytes per baby step (12 once i needs 64 bits), against ~200
+	# for the dict. A fingerprint match is verified with one multiplication.
+	RUN = 1 << 14
+
+	def __init__(self, curve, g, count):
+		self.curve = curve
+		self.g = g
+		shift = 32 if count < 1 << 32 else 64
+		# sorted runs of RUN packed (fingerprint, i) steps, merged at the end,
+		# so the build never holds more than one run as python ints
+		runs = []
+		steps = enumerate(curve.multiples(g, count))
+		while True:
+			run = sorted((pt.x & 0xFFFFFFFF) << shift | i for i, pt in islice(steps, self.RUN))
+			if len(run) == 0:
+				break
+			runs.append(array('Q', run) if shift == 32 else run)
+		self.keys, self.vals = array('I'), array('I' if shift == 32 else 'Q')
+		mask = (1 << shift) - 1
+		merged = heapq.merge(*runs)
+		while True:
+			chunk = list(islice(merged, self.RUN))
+			if len(chunk) == 0:
+				break
+			self.keys.extend([v >> shift for v in chunk])
+			self.vals.extend([v & mask for v in chunk])
+
+	def get(self, pt):
+		fp = pt.x & 0xFFFFFFFF
+		i = bisect_left(self.keys, fp)
+		while i < len(self.keys) and self.keys[i] == fp:
+			if self.curve.mult(self.vals[i], self.g) == pt:
+				return self.vals[i]
+			i += 1
+		return None
+
+
+class BSGSTable:
+	# Baby steps for one (curve, g, n), built once with m additions and kept
+	# around, so every later target only pays for its giant steps.
+	# storage "dict"    - baby steps in a dict, fastest for small n
+	# storage "compact" - baby steps in a CompactTable, 8 bytes per entry
+	# bsgs_table also takes storage "disk", which gives a DiskBSGSTable
+	def __init__(self, curve, g, n, storage="dict"):
+		self.curve = curve
+		self.m = math.ceil(math.sqrt(n))
+		if storage == "compact":
+			self.baby_step = CompactTable(curve, g, self.m)
+		elif storage == "dict":
+			self.baby_step = {pt: i for i, pt in enumerate(curve.multiples(g, self.m))}
+		else:
+			raise ValueError(f"unknown bsgs storage {storage}")
+		self.m_inv = curve.multiply(-self.m, g)
+
+	def solve(self, f):
+		return self.solve_many([f])[0]
+
+	def solve_many(self, targets):
+		# Giant steps of all targets run in lockstep, one inversion per round
+		res = [None] * len(targets)
+		todo, ys = list(range(len(targets))), list(targets)
+		for i in range(self.m):
+			if len(todo) == 0:
+				break
+			left = []
+			for t, y in zip(todo, ys):
+				j = self.baby_step.get(y)
+				if j is None:
+					left.append((t, y))
+				else:
+					res[t] = i * self.m + j
+			todo = [t for t, _ in left]
+			ys = self.curve.add_many([y for _, y in left], [self.m_inv] * len(left))
+		return res
+
+
+# baby/giant step record - 64 bit x fingerprint and index
+RECORD = struct.Struct("<QQ")
+# at most 2^BUCKET_BITS bucket files are written per partitioning pass
+BUCKET_BITS = 6
+
+
+def _read_records(f):
+	f.seek(0)
+	while True:
+		block = f.read(RECORD.size << 12)
+		if len(block) == 0:
+			return
+		yield from RECORD.iter_unpack(block)
+
+
+class DiskBSGSTable(BSGSTable):
+	# External memory BSGS for tables that do not fit in RAM. Baby steps are
+	# spread over up to 2^BUCKET_BITS bucket files by the top bits of their
+	# fingerprint, and a bucket that still holds more than `chunk` records is
+	# split again on the next bits, so only 2^BUCKET_BITS files per level are
+	# open and at most about `chunk` records are sorted in memory. Sorted
+	# buckets are appended to one file in fingerprint order, which is then
+	# memory-mapped. Giant steps are produced `chunk` at a time, sorted, and
+	# merge-joined against the buckets in file order, so every pass over the
+	# table is a sequential read.
+	def __init__(self, curve, g, n, chunk=1 << 20, directory=None):
+		self.curve = curve
+		self.g = g
+		self.m = math.ceil(math.sqrt(n))
+		self.m_inv = curve.multiply(-self.m, g)
+		self.chunk = chunk
+		self.directory = directory
+		# (end fingerprint, start offset, end offset) of every sorted bucket
+		self.buckets = []
+		# fingerprints are below 2^top, buckets split the bits under that
+		self.top = min(64, curve.p.bit_length())
+		self.file = TemporaryFile(dir=directory)
+		records = ((pt.x & 0xFFFFFFFFFFFFFFFF, i) for i, pt in enumerate(curve.multiples(g, self.m)))
+		self._write_sorted(records, self.m, 0, 0)
+		self.file.flush()
+		self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		self.ends = [end for end, _, _ in self.buckets]
+
+	def _write_sorted(self, records, count, prefix, bits):
+		# records all have `prefix` as their top `bits` fingerprint bits
+		if count <= self.chunk or bits == self.top:
+			start = self.file.tell()
+			self.file.write(b"".join(RECORD.pack(*r) for r in sorted(records)))
+			self.buckets.append(((prefix + 1) << (self.top - bits), start, self.file.tell()))
+			return
+		k = min(BUCKET_BITS, self.top - bits, math.ceil(count / self.chunk).bit_length())
+		shift, mask = self.top - bits - k, (1 << k) - 1
+		# write buffers, about `chunk` records over all of them
+		limit = min(1 << 16, max(RECORD.size, (self.chunk * RECORD.size) >> k))
+		buckets = [TemporaryFile(dir=self.directory) for _ in range(1 << k)]
+		buffers = [bytearray() for _ in buckets]
+		counts = [0] * len(buckets)
+		for fp, i in records:
+			b = (fp >> shift) & mask
+			buffers[b] += RECORD.pack(fp, i)
+			counts[b] += 1
+			if len(buffers[b]) >= limit:
+				buckets[b].write(buffers[b])
+				buffers[b] = bytearray()
+		for b, (bucket, buffer) in enumerate(zip(buckets, buffers)):
+			bucket.write(buffer)
+			buffers[b] = None
+			self._write_sorted(_read_records(bucket), counts[b], (prefix << k) | b, bits + k)
+			bucket.close()
+
+	def _join(self, giants):
+		# giants is a sorted list of (fingerprint, target, i), yields matches
+		# (target, i, j) with equal fingerprints, bucket by bucket
+		pos = 0
+		while pos < len(giants):
+			end, start, stop = self.buckets[bisect_right(self.ends, giants[pos][0])]
+			babies = RECORD.iter_unpack(self.data[start:stop])
+			baby = next(babies, None)
+			while pos < len(giants) and giants[pos][0] < end:
+				fp, t, i = giants[pos]
+				while baby is not None and baby[0] < fp:
+					baby = next(babies, None)
+				if baby is not None and baby[0] == fp:
+					yield (t, i, baby[1])
+				pos += 1
+
+	def solve_many(self, targets):
+		res = [None] * len(targets)
+		todo, ys = list(range(len(targets))), list(targets)
+		i = 0
+		while i < self.m and len(todo) != 0:
+			# next batch of giant steps, spread evenly over unsolved targets
+			rounds = min(self.m - i, max(1, self.chunk // len(todo)))
+			giants = []
+			for r in range(rounds):
+				giants.extend((y.x & 0xFFFFFFFFFFFFFFFF, t, i + r) for t, y in zip(todo, ys))
+				ys = self.curve.add_many(ys, [self.m_inv] * len(ys))
+			giants.sort()
+			for t, gi, j in self._join(giants):
+				k = gi * self.m + j
+				if res[t] is None and self.curve.mult(k, self.g) == targets[t]:
+					res[t] = k
+			i += rounds
+			left = [(t, y) for t, y in zip(todo, ys) if res[t] is None]
+			todo, ys = [t for t, _ in left], [y for _, y in left]
+		return res
+
+
+@lru_cache(maxsize=8)
+def _bsgs_table(curve, g, n, storage):
+	if storage == "disk":
+		return DiskBSGSTable(curve, g, n)
+	return BSGSTable(curve, g, n, storage)
+
+
+def bsgs_table(curve, g, n, storage="dict"):
+	# cached on (curve, affine g, n, storage) however it is called, so bsgs()
+	# and direct callers share one table
+	return _bsgs_table(curve, curve.to_affine(g), n, storage)
+
+
+def bsgs(curve, g, f, n, storage="dict"):
+	return bsgs_table(curve, g, n, storage).solve(f)
+
+
+def bsgs_interleaved(curve, g, f, a=0, b=None, n=None, grumpy=False):
+	# Interleaved BSGS for a log in [a, b]. With h = f - a*g, baby steps i*g
+	# and giant steps h - j*m*g (m = sqrt(b - a)) grow together, one point
+	# each per round, and every new point is checked against the other sets.
+	# It needs no group order, stops at the first collision and costs about
+	# 1.33 * sqrt(b - a) additions on average, less for small logs. Without
+	# b, the Hasse bound on the group order is used. The log is reduced mod n
+	# when n is given, otherwise it is whichever one in [a, b] turns up first,
+	# which can be k + ord(g) when [a, b] is wider than the order of g.
+	# grumpy=True switches to Bernstein-Lange "grumpy giants", a second giant
+	# set 2h - j*(m+1)*g with m = sqrt(b - a)/2. n (if known) resolves the odd
+	# case of baby/second giant collisions. Without wrap-around it measured
+	# ~1.6 * sqrt(b - a) additions, so plain interleaving stays the default.
+	if b is None:
+		b = a + curve.p + 2 * isqrt(curve.p) + 1
+	width = b - a
+	m = max(1, math.ceil(math.sqrt(width) / (2 if grumpy else 1)))
+	h = curve.add(f, curve.mult(-a, g))
+	pts = [curve.origin(), h, curve.add(h, h)]
+	steps = [g, curve.mult(-m, g), curve.mult(-(m + 1), g)]
+	if not grumpy:
+		pts, steps = pts[:2], steps[:2]
+	seen = tuple({} for _ in pts)
+
+	def collide(s1, i1, s2, i2):
+		# s1 < s2, returns the log relative to a or None
+		if (s1, s2) == (0, 1):
+			return i1 + i2 * m
+		if (s1, s2) == (1, 2):
+			return i2 * (m + 1) - i1 * m
+		twice = i1 + i2 * (m + 1)
+		if twice % 2 == 0:
+			return twice // 2
+		return None if n is None else (twice * modinv(2, n)) % n
+
+	for t in range(max(m, width // m) + 1):
+		for s, pt in enumerate(pts):
+			for o in range(len(pts)):
+				if o == s or pt not in seen[o]:
+					continue
+				k = collide(o, seen[o][pt], s, t) if o < s else collide(s, t, o, seen[o][pt])
+				if k is not None and n is not None:
+					k %= n
+				if k is not None and 0 <= k <= width and curve.mult(a + k, g) == f:
+					return a + k
+			seen[s].setdefault(pt, t)
+		pts = curve.add_many(pts, steps)
 	return None
 
 
@@ -29,5 +280,82 @@ def test_bsgs():
 	assert res == k
 
 
+def test_bsgs_compact():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pt2 = curve.mult(k, pt1)
+	res = bsgs(curve, pt1, pt2, order, storage="compact")
+	assert res == k
+	table = bsgs_table(curve, pt1, order, "compact").baby_step
+	assert table.keys.itemsize + table.vals.itemsize == 8 and len(table.keys) == isqrt(order - 1) + 1
+
+
+def test_bsgs_many():
+	a = 2
+	b = 3
+	p = 4111
+	order = 4120
+	curve = ec_curve(a, b, p)
+	pt1 = curve(2672, 2565)
+	ks = [randrange(2, order) for _ in range(20)]
+	table = bsgs_table(curve, pt1, order)
+	res = table.solve_many([curve.mult(k, pt1) for k in ks])
+	assert [curve.mult(k, pt1) for k in res] == [curve.mult(k, pt1) for k in ks]
+	hits = _bsgs_table.cache_info().hits
+	assert bsgs(curve, pt1, curve.mult(ks[0], pt1), order) is not None
+	assert _bsgs_table.cache_info().hits == hits + 1
+	assert bsgs_table(curve, pt1, order, "dict") is table
+
+
+def test_bsgs_disk():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	ks = [randrange(2, order) for _ in range(3)]
+	table = DiskBSGSTable(curve, pt1, order, chunk=4096)
+	assert len(table.buckets) == 16
+	assert table.solve_many([curve.mult(k, pt1) for k in ks]) == ks
+	# split twice, far more buckets than files open at once
+	table = DiskBSGSTable(curve, pt1, order, chunk=16)
+	assert len(table.buckets) > 1 << BUCKET_BITS
+	fps = [fp for fp, _ in RECORD.iter_unpack(table.data)]
+	assert len(fps) == table.m and fps == sorted(fps)
+	assert table.solve(curve.mult(ks[1], pt1)) == ks[1]
+	assert bsgs(curve, pt1, curve.mult(ks[0], pt1), order, storage="disk") == ks[0]
+
+
+def test_bsgs_interleaved():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	for width in (1, 100, 10**6):
+		lo = randrange(0, p // 2)
+		k = lo + randrange(0, width + 1)
+		assert bsgs_interleaved(curve, pt1, curve.mult(k, pt1), lo, lo + width) == k
+	curve = ec_curve(2, 3, 4111)
+	pt1 = curve(2672, 2565)
+	k = randrange(2, 4120)
+	f = curve.mult(k, pt1)
+	# the default bound is wider than the order, only n pins the log down
+	assert curve.mult(bsgs_interleaved(curve, pt1, f), pt1) == f
+	assert bsgs_interleaved(curve, pt1, f, n=4120) == k
+	assert bsgs_interleaved(curve, pt1, curve.mult(64, pt1), n=4120) == 64
+	assert bsgs_interleaved(curve, pt1, f, 0, 4119, 4120, grumpy=True) == k
+
+
 if __name__ == "__main__":
 	test_bsgs()
+	test_bsgs_compact()
+	test_bsgs_many()
+	test_bsgs_disk()
+	test_bsgs_interleaved()
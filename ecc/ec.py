@@ -1,6 +1,9 @@
 from collections import namedtuple
+from functools import lru_cache
+from random import randrange
 
-from utils import isprime, modinv, polyroots_prime, sqrtmod_prime
+from utils import (batch_modinv, count_points, factorint, gcd, isprime, isqrt, legendre, modinv, polyroots_prime, schoof,
+                   sqrtmod_prime)
 
 
 class ec_point(namedtuple("ec_point", "x y z", defaults=(1, ))):
@@ -8,7 +11,109 @@ class ec_point(namedtuple("ec_point", "x y z", defaults=(1, ))):
 		return self.z == 0
 
 	def __repr__(self):
-		return f"pt({self.x}, {self.y})" if self.z == 1 else "Pt(Origin)"
+		if self.z == 0:
+			return "Pt(Origin)"
+		if self.z == 1:
+			return f"pt({self.x}, {self.y})"
+		return f"pt({self.x}, {self.y}, {self.z})"
+
+
+def wnaf(n, w):
+	# width-w non adjacent form of n >= 0, least significant digit first.
+	# Every non-zero digit is odd and smaller than 2^(w-1) in magnitude.
+	digits = []
+	half, full = 1 << (w - 1), 1 << w
+	while n > 0:
+		d = 0
+		if n & 1:
+			d = n & (full - 1)
+			if d >= half:
+				d -= full
+			n -= d
+		digits.append(d)
+		n >>= 1
+	return digits
+
+
+def window_width(bits):
+	# Precomputed tables are cached, so wider windows pay off quickly
+	if bits < 16:
+		return 2
+	if bits < 64:
+		return 3
+	if bits < 192:
+		return 4
+	return 5
+
+
+@lru_cache(maxsize=256)
+def odd_multiples(curve, pt, count):
+	# [P, 3P, 5P, ..., (2*count - 1)P] in affine coordinates, for an affine P
+	if count == 1:
+		return (pt, )
+	double = curve.jacobian_double(pt)
+	table = [pt]
+	for _ in range(count - 1):
+		table.append(curve.jacobian_add(table[-1], double))
+	return tuple(curve.to_affine_many(table))
+
+
+class ec_comb:
+	# Lim-Lee comb for a fixed base point. The scalar is cut into w rows of
+	# d bits, one column of bits picks a precomputed sum of rows, so a
+	# multiplication costs d doublings and at most d additions.
+	def __init__(self, curve, pt, bits, w=6):
+		self.curve = curve
+		self.pt = curve.to_affine(pt)
+		self.w = w
+		self.d = -(-bits // w)
+		rows = [self.pt]
+		for _ in range(w - 1):
+			row = rows[-1]
+			for _ in range(self.d):
+				row = curve.jacobian_double(row)
+			rows.append(row)
+		rows = curve.to_affine_many(rows)
+		# table[i] = sum of 2^(j*d) * pt over the set bits j of i
+		table = [curve.origin()]
+		for i in range(1, 1 << w):
+			j = i.bit_length() - 1
+			table.append(curve.jacobian_add(table[i ^ (1 << j)], rows[j]))
+		self.table = curve.to_affine_many(table)
+
+	def multiply_jacobian(self, n):
+		curve = self.curve
+		if n < 0:
+			return curve.invert(self.multiply_jacobian(-n))
+		if n.bit_length() > self.d * self.w:
+			return curve.multiply_jacobian(n, self.pt)
+		res = curve.origin()
+		for col in range(self.d - 1, -1, -1):
+			res = curve.jacobian_double(res)
+			idx = 0
+			for j in range(self.w):
+				idx |= ((n >> (j * self.d + col)) & 1) << j
+			if idx:
+				res = curve.jacobian_add(res, self.table[idx])
+		return res
+
+	def multiply(self, n):
+		res = self.curve.to_affine(self.multiply_jacobian(n))
+		self.curve.assert_check(res)
+		return res
+
+
+def odd_multiples_table(curve, pt, count, cached=True):
+	# odd_multiples, through the cache unless cached=False. A one-entry
+	# table is just P (every w=2 multiplication) and never takes a slot.
+	if count == 1:
+		return (pt, )
+	return (odd_multiples if cached else odd_multiples.__wrapped__)(curve, pt, count)
+
+
+@lru_cache(maxsize=16)
+def comb_table(curve, pt, bits, w=6):
+	return ec_comb(curve, pt, bits, w)
 
 
 class ec_curve:
@@ -27,6 +132,12 @@ class ec_curve:
 		self.j_invariant = 1728 + (a4 * modinv(a4b27, self.p))
 		self.card = order
 
+	def __eq__(self, other):
+		return isinstance(other, ec_curve) and (self.a, self.b, self.p) == (other.a, other.b, other.p)
+
+	def __hash__(self):
+		return hash((self.a, self.b, self.p))
+
 	def __repr__(self):
 		return f"elliptic curve y^2 = x^3 + {self.a}x + {self.b} over Zmod({self.p})"
 
@@ -73,37 +184,290 @@ class ec_curve:
 		self.assert_check(pt)
 		return pt
 
+	def add_many(self, pts1, pts2):
+		# pts1[i] + pts2[i] for affine points, every addition in the batch
+		# shares a single inversion (Montgomery's trick)
+		p = self.p
+		res, todo, dens = [], [], []
+		for pt1, pt2 in zip(pts1, pts2):
+			if pt1.is_origin():
+				res.append(pt2)
+			elif pt2.is_origin():
+				res.append(pt1)
+			elif pt1.x == pt2.x and (pt1.y + pt2.y) % p == 0:
+				res.append(self.origin())
+			else:
+				todo.append(len(res))
+				res.append(None)
+				dens.append(2 * pt1.y if pt1.x == pt2.x else pt2.x - pt1.x)
+		invs = batch_modinv(dens, p)
+		for i, inv in zip(todo, invs):
+			x1, y1, _ = pts1[i]
+			x2, y2, _ = pts2[i]
+			if x1 == x2:
+				temp = ((3 * x1 * x1 + self.a) * inv) % p
+			else:
+				temp = ((y2 - y1) * inv) % p
+			x = (temp * temp - x1 - x2) % p
+			res[i] = ec_point(x, (temp * (x1 - x) - y1) % p)
+		return res
+
+	def multiples(self, pt, count, batch=256):
+		# Yields 0, pt, 2pt, ..., (count-1)pt by repeated addition. Runs
+		# `batch` walkers in lockstep, so it costs count additions but only
+		# about count/batch inversions, and holds one row of points at a time.
+		if count <= 0:
+			return
+		batch = max(1, min(batch, count))
+		row = [self.origin()]
+		for _ in range(batch - 1):
+			row.append(self.jacobian_add(row[-1], pt))
+		row = self.to_affine_many(row)
+		step = [self.to_affine(self.jacobian_add(row[-1], pt))] * batch
+		while True:
+			for item in row:
+				yield item
+				count -= 1
+				if count == 0:
+					return
+			row = self.add_many(row, step)
+
 	def invert(self, pt):
-		return ec_point(pt.x, self.p - pt.y)
+		# works for both affine and jacobian points
+		return ec_point(pt.x, (-pt.y) % self.p, pt.z)
 
-	def multiply(self, n, pt):
-		if n == 0:
+	# Jacobian coordinates - (X, Y, Z) is the affine point (X/Z^2, Y/Z^3).
+	# An affine point is already a jacobian point with Z = 1, so only the
+	# way back (to_affine) costs an inversion.
+	def to_affine(self, pt):
+		if pt.is_origin():
 			return self.origin()
-		if n < 0:
-			pt = self.invert(pt)
-			self.assert_check(pt)
-			n = -n
-		curr_bit_no = pt
+		if pt.z == 1:
+			return pt
+		z_inv = modinv(pt.z, self.p)
+		z_inv2 = (z_inv * z_inv) % self.p
+		return ec_point((pt.x * z_inv2) % self.p, (pt.y * z_inv2 * z_inv) % self.p)
+
+	def to_affine_many(self, pts):
+		# Normalizes a list of jacobian points with a single inversion
+		todo = [i for i, pt in enumerate(pts) if not pt.is_origin() and pt.z != 1]
+		z_invs = batch_modinv([pts[i].z for i in todo], self.p)
+		res = [self.origin() if pt.is_origin() else pt for pt in pts]
+		for i, z_inv in zip(todo, z_invs):
+			z_inv2 = (z_inv * z_inv) % self.p
+			res[i] = ec_point((pts[i].x * z_inv2) % self.p, (pts[i].y * z_inv2 * z_inv) % self.p)
+		return res
+
+	def jacobian_double(self, pt):
+		if pt.is_origin() or pt.y % self.p == 0:
+			return self.origin()
+		p = self.p
+		x, y, z = pt
+		yy = (y * y) % p
+		s = (4 * x * yy) % p
+		if z == 1:
+			m = (3 * x * x + self.a) % p
+		else:
+			zz = (z * z) % p
+			m = (3 * x * x + self.a * zz * zz) % p
+		x3 = (m * m - 2 * s) % p
+		y3 = (m * (s - x3) - 8 * yy * yy) % p
+		z3 = (2 * y * z) % p
+		return ec_point(x3, y3, z3)
+
+	def jacobian_add(self, pt1, pt2):
+		if pt1.is_origin():
+			return pt2
+		if pt2.is_origin():
+			return pt1
+		p = self.p
+		x1, y1, z1 = pt1
+		x2, y2, z2 = pt2
+		# z == 1 is the common case (mixed addition with an affine point)
+		if z2 == 1:
+			u1, s1 = x1, y1
+		else:
+			z2z2 = (z2 * z2) % p
+			u1, s1 = (x1 * z2z2) % p, (y1 * z2 * z2z2) % p
+		if z1 == 1:
+			u2, s2 = x2, y2
+		else:
+			z1z1 = (z1 * z1) % p
+			u2, s2 = (x2 * z1z1) % p, (y2 * z1 * z1z1) % p
+		h = (u2 - u1) % p
+		r = (s2 - s1) % p
+		if h == 0:
+			if r == 0:
+				return self.jacobian_double(pt1)
+			return self.origin()
+		hh = (h * h) % p
+		hhh = (h * hh) % p
+		v = (u1 * hh) % p
+		x3 = (r * r - hhh - 2 * v) % p
+		y3 = (r * (v - x3) - s1 * hhh) % p
+		z3 = (h * z1 * z2) % p
+		return ec_point(x3, y3, z3)
+
+	def multiply_jacobian(self, n, pt, method="wnaf", w=None, cached=True):
+		# The result is left in jacobian coordinates. Tables of odd multiples
+		# used by "wnaf" and "sliding" are cached per (curve, point), pass
+		# cached=False for one-off points so they do not push out the rest.
+		if n == 0 or pt.is_origin():
+			return self.origin()
+		pt = self.to_affine(pt)
+		if w is None:
+			w = window_width(abs(n).bit_length())
+		if method == "binary":
+			res = self._multiply_binary(abs(n), pt)
+		elif method == "wnaf":
+			res = self._multiply_wnaf(abs(n), pt, w, cached)
+		elif method == "sliding":
+			res = self._multiply_sliding(abs(n), pt, w, cached)
+		else:
+			raise ValueError(f"unknown scalar multiplication method {method}")
+		return self.invert(res) if n < 0 else res
+
+	def _multiply_binary(self, n, pt):
+		res = self.origin()
+		for bit in bin(n)[2:]:
+			res = self.jacobian_double(res)
+			if bit == '1':
+				res = self.jacobian_add(res, pt)
+		return res
+
+	def _multiply_wnaf(self, n, pt, w, cached=True):
+		table = odd_multiples_table(self, pt, 1 << (w - 2), cached)
+		res = self.origin()
+		for d in reversed(wnaf(n, w)):
+			res = self.jacobian_double(res)
+			if d > 0:
+				res = self.jacobian_add(res, table[d >> 1])
+			elif d < 0:
+				res = self.jacobian_add(res, self.invert(table[-d >> 1]))
+		return res
+
+	def _multiply_sliding(self, n, pt, w, cached=True):
+		table = odd_multiples_table(self, pt, 1 << (w - 1), cached)
+		bits = bin(n)[2:]
 		res = self.origin()
-		while n > 0:
-			if n % 2 == 1:
-				res = self.add(res, curr_bit_no)
-			curr_bit_no = self.add(curr_bit_no, curr_bit_no)
-			n = n // 2
+		i = 0
+		while i < len(bits):
+			if bits[i] == '0':
+				res = self.jacobian_double(res)
+				i += 1
+				continue
+			# longest window of at most w bits that ends in a 1
+			j = min(i + w, len(bits))
+			while bits[j - 1] == '0':
+				j -= 1
+			for _ in range(j - i):
+				res = self.jacobian_double(res)
+			res = self.jacobian_add(res, table[int(bits[i:j], 2) >> 1])
+			i = j
+		return res
+
+	def multiply(self, n, pt, method="wnaf", cached=True):
+		res = self.to_affine(self.multiply_jacobian(n, pt, method, cached=cached))
+		self.assert_check(res)
+		return res
+
+	def multi_multiply_jacobian(self, terms, cached=True):
+		# sum of k*P over a list of (k, P) pairs, left in jacobian coordinates.
+		# cached=False keeps the points' tables out of the odd_multiples cache.
+		pairs = []
+		for k, pt in terms:
+			if k == 0 or pt.is_origin():
+				continue
+			pt = self.to_affine(pt)
+			pairs.append((k, pt) if k > 0 else (-k, self.invert(pt)))
+		if len(pairs) == 0:
+			return self.origin()
+		if len(pairs) == 1:
+			return self.multiply_jacobian(*pairs[0], cached=cached)
+		# Shamir's trick needs no tables, so it wins for two short scalars.
+		# Past that the cached wNAF tables of the interleaved method pay off.
+		if len(pairs) == 2 and max(k for k, _ in pairs).bit_length() < 64:
+			return self._multi_shamir(pairs)
+		if len(pairs) < 16:
+			return self._multi_interleaved(pairs, cached)
+		return self._multi_pippenger(pairs)
+
+	def _multi_shamir(self, pairs):
+		# Shamir's trick - one shared ladder, add P, Q or P + Q per bit pair
+		(k1, pt1), (k2, pt2) = pairs
+		table = [None, pt1, pt2, self.to_affine(self.jacobian_add(pt1, pt2))]
+		res = self.origin()
+		for i in range(max(k1.bit_length(), k2.bit_length()) - 1, -1, -1):
+			res = self.jacobian_double(res)
+			idx = ((k1 >> i) & 1) | (((k2 >> i) & 1) << 1)
+			if idx:
+				res = self.jacobian_add(res, table[idx])
+		return res
+
+	def _multi_interleaved(self, pairs, cached=True):
+		# Straus - wNAF digits of every scalar walked by one shared ladder
+		digits, tables = [], []
+		for k, pt in pairs:
+			w = window_width(k.bit_length())
+			digits.append(wnaf(k, w))
+			tables.append(odd_multiples_table(self, pt, 1 << (w - 2), cached))
+		res = self.origin()
+		for i in range(max(len(d) for d in digits) - 1, -1, -1):
+			res = self.jacobian_double(res)
+			for ds, table in zip(digits, tables):
+				d = ds[i] if i < len(ds) else 0
+				if d > 0:
+					res = self.jacobian_add(res, table[d >> 1])
+				elif d < 0:
+					res = self.jacobian_add(res, self.invert(table[-d >> 1]))
+		return res
+
+	def _multi_pippenger(self, pairs):
+		# Bucket method - every c-bit window of every scalar drops its point
+		# into one of 2^c - 1 buckets, which are then summed with a running sum
+		c = max(2, len(pairs).bit_length() - 2)
+		mask = (1 << c) - 1
+		bits = max(k.bit_length() for k, _ in pairs)
+		res = self.origin()
+		for shift in range(((bits - 1) // c) * c, -1, -c):
+			for _ in range(c):
+				res = self.jacobian_double(res)
+			buckets = [self.origin()] * (1 << c)
+			for k, pt in pairs:
+				idx = (k >> shift) & mask
+				if idx:
+					buckets[idx] = self.jacobian_add(buckets[idx], pt)
+			running, acc = self.origin(), self.origin()
+			for j in range(mask, 0, -1):
+				running = self.jacobian_add(running, buckets[j])
+				acc = self.jacobian_add(acc, running)
+			res = self.jacobian_add(res, acc)
+		return res
+
+	def multi_mult(self, terms):
+		res = self.to_affine(self.multi_multiply_jacobian(terms))
 		self.assert_check(res)
 		return res
 
-	def mult(self, n, pt):
-		return self.multiply(n, pt)
+	def mult_fixed(self, n, pt):
+		# For base points that are multiplied over and over (generators).
+		# Scalars up to the bit length of the group order go through a cached
+		# comb table, anything larger falls back to multiply().
+		return comb_table(self, self.to_affine(pt), self.p.bit_length() + 1).multiply(n)
 
-	def mul(self, n, pt):
-		return self.multiply(n, pt)
+	def mult(self, n, pt, method="wnaf", cached=True):
+		return self.multiply(n, pt, method, cached)
+
+	def mul(self, n, pt, method="wnaf", cached=True):
+		return self.multiply(n, pt, method, cached)
 
 	def cardinality(self):
 		if self.card is not None:
 			return self.card
 		if self.p < 5000:
-			self.card = self._cardinality_naive()
+			self.card = count_points(self.a, self.b, self.p)
+		elif self.p < 1 << 64:
+			self.card = self._cardinality_mestre()
 		else:
 			self.card = self._cardinality_schoof()
 		return self.card
@@ -111,16 +475,67 @@ class ec_curve:
 	def _cardinality_naive(self):
 		if self.card is not None:
 			return self.card
-		self.card = 0
+		# the point at infinity, then every affine point
+		self.card = 1
 		for i in range(self.p):
 			pts = self.from_x(i)
 			if len(pts) != 0:
 				self.card += len(pts)
 		return self.card
 
+	def _cardinality_mestre(self):
+		# #E and #E' of the quadratic twist both lie in the Hasse interval
+		# [p + 1 - 2sqrt(p), p + 1 + 2sqrt(p)] and add up to 2p + 2. Orders
+		# of random points on either curve come from BSGS over the interval,
+		# about p^(1/4) steps each, until the lcm of the orders on one side
+		# has a single multiple in the interval. By Mestre's theorem one of
+		# the two gets there for every p > 229.
+		p = self.p
+		lo, hi = p + 1 - isqrt(4 * p), p + 1 + isqrt(4 * p)
+		d = next(d for d in range(2, p) if legendre(d, p) == -1)
+		twist = ec_curve(self.a * d * d, self.b * d**3, p, verify=False)
+		orders = [1, 1]
+		while True:
+			for i, curve in enumerate((self, twist)):
+				order = curve._order_in_interval(curve._random_point(), lo, hi)
+				orders[i] = orders[i] * order // gcd(orders[i], order)
+				first = -(-lo // orders[i]) * orders[i]
+				if first + orders[i] > hi:
+					return first if i == 0 else 2 * p + 2 - first
+
+	def _random_point(self):
+		while True:
+			pts = self.from_x(randrange(self.p))
+			if len(pts) != 0:
+				return pts[randrange(len(pts))]
+
+	def _order_in_interval(self, pt, lo, hi):
+		# exact order of pt, given that some multiple of it lies in [lo, hi]
+		m = isqrt(hi - lo) + 1
+		baby = {q: j for j, q in enumerate(self.multiples(pt, m))}
+		# pt is a fresh random point, keep its tables out of the cache
+		giant, step = self.mult(-lo, pt, cached=False), self.mult(-m, pt, cached=False)
+		for i in range(m + 1):
+			j = baby.get(giant)
+			if j is not None:
+				order = lo + i * m + j
+				break
+			giant = self.add(giant, step)
+		else:
+			raise ArithmeticError(f"{pt} has no multiple in [{lo}, {hi}]")
+		for q in factorint(order):
+			while order % q == 0 and self.mult(order // q, pt, cached=False).is_origin():
+				order //= q
+		return order
+
 	def _cardinality_schoof(self):
-		# TODO - needs math for endomorphism, torsion, division polynomials
-		raise NotImplementedError("Schoof algorithm is currently not implemented. In the meantime, use sage")
+		# Plain Schoof in pure python grows like log(p)^5 - about 10s for a
+		# 64 bit p, 2 minutes at 100 bits, hours for 256 bit curves. Above
+		# 128 bits pass the order to ec_curve instead (SEA, e.g. from sage).
+		if self.p.bit_length() > 128:
+			raise ValueError(f"point counting over a {self.p.bit_length()} bit field is out of reach for Schoof "
+			                 "here, pass order= to ec_curve (e.g. from sage)")
+		return schoof(self.a, self.b, self.p)
 
 	def __call__(self, x, y, z=1):
 		res = ec_point(x, y, z)
@@ -130,3 +545,112 @@ class ec_curve:
 	@staticmethod
 	def origin():
 		return ec_point(0, 1, 0)
+
+
+def test_jacobian():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pt2 = curve.origin()
+	for _ in range(200):
+		pt2 = curve.add(pt2, pt1)
+	assert curve.multiply(200, pt1) == pt2
+	assert curve.multiply(-200, pt1) == curve.invert(pt2)
+	k = randrange(2, p)
+	pt3 = curve.multiply_jacobian(k, pt1)
+	assert curve.to_affine(curve.jacobian_add(pt3, pt3)) == curve.multiply(2 * k, pt1)
+	assert curve.to_affine(curve.jacobian_add(pt3, curve.invert(pt3))).is_origin()
+
+
+def test_windowed_multiply():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	for _ in range(20):
+		k = randrange(-p, p)
+		res = curve.mult(k, pt1, "binary")
+		for w in (2, 3, 4, 5):
+			assert curve.to_affine(curve.multiply_jacobian(k, pt1, "wnaf", w)) == res
+			assert curve.to_affine(curve.multiply_jacobian(k, pt1, "sliding", w)) == res
+	assert sum(d != 0 for d in wnaf(0b1011101111, 3)) <= 4
+	hits = odd_multiples.cache_info().hits
+	curve.mult(randrange(p), pt1)
+	assert odd_multiples.cache_info().hits > hits
+	# one-entry wNAF tables (w=2) and cached=False leave the cache alone
+	info = odd_multiples.cache_info()
+	pt2 = curve.mult(12345, pt1)
+	assert curve.mult(2, pt2) == curve.add(pt2, pt2)
+	assert curve.mult(3, pt2) == curve.add(pt2, curve.add(pt2, pt2))
+	assert curve.mult(randrange(p), pt2, cached=False) is not None
+	assert odd_multiples.cache_info() == info
+
+
+def test_fixed_base():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	for k in [0, 1, 2, -1, p, 2 * p, p**3] + [randrange(-p, p) for _ in range(20)]:
+		assert curve.mult_fixed(k, pt1) == curve.mult(k, pt1)
+	for w in (1, 2, 4, 8):
+		k = randrange(p)
+		assert ec_comb(curve, pt1, p.bit_length(), w).multiply(k) == curve.mult(k, pt1)
+
+
+def test_multi_mult():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	for size in (0, 1, 2, 3, 7, 16, 40):
+		terms = [(randrange(-p, p), curve.mult(randrange(1, p), pt1)) for _ in range(size)]
+		res = curve.origin()
+		for k, pt in terms:
+			res = curve.add(res, curve.mult(k, pt))
+		assert curve.multi_mult(terms) == res
+	assert curve.multi_mult([(5, pt1), (-5, pt1)]).is_origin()
+
+
+def test_add_many():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pts1 = [curve.mult(randrange(p), pt1) for _ in range(50)]
+	pts2 = [curve.mult(randrange(p), pt1) for _ in range(50)]
+	pts1 += [curve.origin(), pt1, pt1, pt1]
+	pts2 += [pt1, curve.origin(), pt1, curve.invert(pt1)]
+	assert curve.add_many(pts1, pts2) == [curve.add(x, y) for x, y in zip(pts1, pts2)]
+	assert list(curve.multiples(pt1, 1000, 64)) == [curve.mult(i, pt1) for i in range(1000)]
+	assert list(curve.multiples(pt1, 3)) == [curve.origin(), pt1, curve.mult(2, pt1)]
+
+
+def test_cardinality():
+	for (a, b, p) in [(2, 3, 97), (1, 1, 101), (2, 9, 4111)]:
+		assert schoof(a, b, p) == ec_curve(a, b, p)._cardinality_naive()
+		assert count_points(a, b, p) == count_points(a, b, p, chunk=7) == schoof(a, b, p)
+	assert ec_curve(2, 9, 1035418103).cardinality() == 1035356653
+	assert schoof(2, 9, 1035418103) == 1035356653
+	for (a, b, p) in [(-3, 5, 10007), (0, 7, 10009), (1, 0, 10007)]:
+		assert ec_curve(a, b, p)._cardinality_mestre() == schoof(a, b, p)
+	try:
+		ec_curve(-3, 7, 2**255 - 19).cardinality()
+		assert False, "cardinality() of a 255 bit curve should ask for order="
+	except ValueError:
+		pass
+
+
+if __name__ == "__main__":
+	test_jacobian()
+	test_windowed_multiply()
+	test_fixed_base()
+	test_multi_mult()
+	test_add_many()
+	test_cardinality()
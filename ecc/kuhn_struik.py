@@ -0,0 +1,107 @@
+from random import randrange
+
+from ec import ec_curve
+from utils import isqrt
+
+
+class MultiTargetRho:
+	# Kuhn-Struik style batch DLP in <g> of order n. Walks only add multiples
+	# of g (R -> R + c_j*g, j picked from x), so a walk started at h + y*g
+	# stays at h + (y + dist)*g, and every distinguished point it reaches has
+	# a known log as soon as log(h) is known. Those points are kept, so each
+	# solved target makes the next ones cheaper - about sqrt(n/L) additions
+	# per target once L targets are solved.
+	def __init__(self, curve, g, n, r=32, dp_bits=None, batch=16):
+		self.curve = curve
+		self.g = g
+		self.n = n
+		self.batch = batch
+		if dp_bits is None:
+			dp_bits = max(0, n.bit_length() // 4)
+		self.dp_mask = (1 << dp_bits) - 1
+		self.max_len = 20 << dp_bits
+		self.coeffs = [randrange(1, n) for _ in range(r)]
+		self.steps = [curve.mult(c, g) for c in self.coeffs]
+		# distinguished point -> its log
+		self.known = {}
+
+	def walk_many(self, starts):
+		# follows every (point, distance) start to a distinguished point, all
+		# walks in lockstep with one batched addition per round. Returns
+		# (point, distance) per start, None for walks that seem stuck in a cycle.
+		res = [None] * len(starts)
+		active = [(i, pt, dist) for i, (pt, dist) in enumerate(starts)]
+		for _ in range(self.max_len + 1):
+			left = []
+			for i, pt, dist in active:
+				if pt.x & self.dp_mask == 0:
+					res[i] = (pt, dist)
+				else:
+					left.append((i, pt, dist))
+			if len(left) == 0:
+				break
+			idx = [pt.x % len(self.steps) for _, pt, _ in left]
+			pts = self.curve.add_many([pt for _, pt, _ in left], [self.steps[j] for j in idx])
+			active = [(i, pt, dist + self.coeffs[j]) for (i, _, dist), pt, j in zip(left, pts, idx)]
+		return res
+
+	def walk(self, pt, dist):
+		return self.walk_many([(pt, dist)])[0]
+
+	def solve(self, h, max_tries=3):
+		# Gives up with None after max_tries times the expected number of
+		# walks (h not in <g>, or a wrong n).
+		curve, n = self.curve, self.n
+		pending = {}
+		max_walks = max_tries * 20 * ((isqrt(n) >> self.dp_mask.bit_length()) + self.batch)
+		walks = 0
+		while walks < max_walks:
+			walks += self.batch
+			found = []
+			# tame walks from known logs, only while the shared store is
+			# smaller than what this target has produced (first few targets)
+			if len(self.known) < len(pending):
+				ys = [randrange(n) for _ in range(self.batch)]
+				for res in self.walk_many([(curve.mult(y, self.g), y) for y in ys]):
+					if res is not None and res[0] not in self.known:
+						self.known[res[0]] = res[1] % n
+						if res[0] in pending:
+							found.append(res[0])
+			else:
+				ys = [randrange(n) for _ in range(self.batch)]
+				for res in self.walk_many([(curve.add(h, curve.mult(y, self.g)), y) for y in ys]):
+					if res is not None and res[0] not in pending:
+						pending[res[0]] = res[1]
+						if res[0] in self.known:
+							found.append(res[0])
+			# only the distinguished points this round added can be new matches
+			for pt in found:
+				k = (self.known[pt] - pending[pt]) % n
+				if curve.mult(k, self.g) == h:
+					for other, off in pending.items():
+						self.known.setdefault(other, (k + off) % n)
+					return k
+		return None
+
+	def solve_many(self, targets):
+		return [self.solve(h) for h in targets]
+
+
+def test_kuhn_struik():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	ks = [randrange(2, order) for _ in range(8)]
+	solver = MultiTargetRho(curve, pt1, order)
+	assert solver.solve_many([curve.mult(k, pt1) for k in ks]) == ks
+	# g of order 2060, h not a multiple of it
+	curve = ec_curve(2, 3, 4111)
+	h = curve(2672, 2565)
+	assert MultiTargetRho(curve, curve.add(h, h), 2060).solve(h) is None
+
+
+if __name__ == "__main__":
+	test_kuhn_struik()
@@ -1,28 +1,134 @@
+from multiprocessing import Pool
 from random import randrange
 
 from bsgs import bsgs
 from ec import ec_curve
-from utils import crt, factorint
+from pollard_kangaroo import pollard_kangaroo, pollard_kangaroo_parallel
+from pollard_rho import pollard_rho
+from utils import crt, ecm, factorint, iterprod
 
 
-def pohlig(curve, g, f, n, limit=0):
+def naive_dlog(curve, g, f, n):
+	pt = curve.origin()
+	for i in range(n):
+		if pt == f:
+			return i
+		pt = curve.add(pt, g)
+	return None
+
+
+def rho_dlog(curve, g, f, n):
+	return pollard_rho(curve, g, f, n, mode="negation")
+
+
+def subgroup_solver(p, naive_limit=64, bsgs_limit=1 << 32):
+	# naive walk for tiny primes, bsgs while its sqrt(p) table is cheap,
+	# pollard rho (constant memory) above that
+	if p < naive_limit:
+		return naive_dlog
+	if p < bsgs_limit:
+		return bsgs
+	return rho_dlog
+
+
+def prime_power_dlog(curve, g, f, p, e, solver=None):
+	# g has order p^e. x is lifted one base-p digit at a time, each digit is
+	# a log in the subgroup of order p, so this costs e*sqrt(p), not sqrt(p^e)
+	if solver is None:
+		solver = subgroup_solver(p)
+	gamma = curve.mult(p**(e - 1), g)
+	x = 0
+	for i in range(e):
+		c = p**(e - 1 - i)
+		h = curve.multi_mult([(c, f), (-c * x, g)])
+		d = 0 if h.is_origin() else solver(curve, gamma, h, p)
+		if d is None:
+			return None
+		x += d * p**i
+	return x
+
+
+def subgroup_exponent(curve, g, p, e):
+	# g has order dividing p^e, returns e' <= e with order exactly p^e'. It is
+	# below e when the base point does not generate the whole p-part (not a
+	# generator, or a non-cyclic group).
+	for i in range(e + 1):
+		if g.is_origin():
+			return i
+		g = curve.mult(p, g)
+	raise ValueError(f"{p}^{e} is not a multiple of the order of the base point")
+
+
+def _solve_subgroup(args):
+	# (p^e', log mod p^e') for the order p^e' the base point really has
+	# there, or (p^e', None) if the solver gave up
+	curve, g, f, p, e, power, solver = args
+	g_power_k = curve.mult(power, g)
+	assert curve.check(g_power_k)
+	r_power_k = curve.mult(power, f)
+	e = subgroup_exponent(curve, g_power_k, p, e)
+	if e == 0:
+		return (1, 0)
+	return (p**e, prime_power_dlog(curve, g_power_k, r_power_k, p, e, solver))
+
+
+def _combine(results):
+	# (log, modulus) by incremental crt, None if any subgroup went unsolved
+	res, mod = 0, 1
+	for factor, rem in results:
+		if rem is None:
+			return (None, mod)
+		res, mod = crt([res, rem], [mod, factor]), mod * factor
+	return (res, mod)
+
+
+def kangaroo_cofactor(curve, g, f, r, mod, n, workers=1, tries=8):
+	# k = r (mod `mod`) is known, so k = r + mod*t with t in [0, n/mod), and
+	# f - r*g = t*(mod*g) is an interval DLP. Kangaroo runs can miss, every
+	# retry shifts the target by a random known offset.
+	G = curve.mult(mod, g)
+	F = curve.add(f, curve.mult(-r, g))
+	width = -(-n // mod)
+	for _ in range(tries):
+		s = randrange(width)
+		F_s = curve.add(F, curve.mult(s, G))
+		if workers > 1:
+			t = pollard_kangaroo_parallel(G, curve, F_s, s, s + width, workers=workers)
+		else:
+			t = pollard_kangaroo(G, curve, F_s, s, s + width)
+		if t is not None and curve.mult(t - s, G) == F:
+			return (r + mod * (t - s)) % n
+	return None
+
+
+def pohlig(curve, g, f, n, limit=0, solver=None, workers=1):
+	# solver(curve, g, f, p) solves the prime order subproblems, by default
+	# it is picked per prime by subgroup_solver. With workers > 1 the
+	# subgroups are solved on a process pool, largest prime first, and
+	# combined as they come back (solver then has to be picklable).
+	# Subgroups of order above `limit` are skipped, the rest of the log is
+	# then found with a kangaroo search over n/(solved part) candidates.
+	# Cofactors that trial division and rho leave behind go to ECM, with
+	# one process per worker running its own curves.
 	subgroups = n
 	if isinstance(n, int):
-		subgroups = factorint(n)
+		subgroups = factorint(n, methods=(ecm, ) * max(1, workers))
 	factors = [i**j for i, j in subgroups.items()]
-	prod = 1
-	for i in factors:
-		prod *= i
-	exponents = [prod // i for i in factors]
-	remainders = []
-	for factor, power in zip(factors, exponents):
+	prod = iterprod(factors)
+	tasks = []
+	for (p, e), factor in zip(subgroups.items(), factors):
 		if limit != 0 and factor > limit:
 			continue
-		g_power_k = curve.mult(power, g)
-		assert curve.check(g_power_k)
-		r_power_k = curve.mult(power, f)
-		remainders.append(bsgs(curve, g_power_k, r_power_k, factor))
-	return crt(remainders, factors)
+		tasks.append((curve, g, f, p, e, prod // factor, solver))
+	if workers <= 1:
+		res, mod = _combine(map(_solve_subgroup, tasks))
+	else:
+		tasks.sort(key=lambda task: task[3], reverse=True)
+		with Pool(workers) as pool:
+			res, mod = _combine(pool.imap_unordered(_solve_subgroup, tasks))
+	if res is None or len(tasks) == len(factors):
+		return res
+	return kangaroo_cofactor(curve, g, f, res, mod, prod, workers)
 
 
 def test_pohlig():
@@ -38,5 +144,68 @@ def test_pohlig():
 	assert res == k
 
 
+def test_pohlig_rho():
+	a = 2
+	b = 3
+	p = 1125899839733759
+	order = 1125899867612160
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(436757568245484, 726713018309225)
+	pt2 = curve.multiply(k, pt1)
+	# everything above the naive limit goes to rho
+	solver = lambda curve, g, f, p: subgroup_solver(p, bsgs_limit=0)(curve, g, f, p)
+	res = pohlig(curve, pt1, pt2, order, solver=solver)
+	assert res == k
+
+
+def test_pohlig_parallel():
+	a = 2
+	b = 3
+	p = 1125899839733759
+	order = 1125899867612160
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(436757568245484, 726713018309225)
+	pt2 = curve.multiply(k, pt1)
+	res = pohlig(curve, pt1, pt2, order, workers=2)
+	assert res == k
+
+
+def test_pohlig_kangaroo():
+	a = 2
+	b = 3
+	p = 1125899839733759
+	order = 1125899867612160
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(436757568245484, 726713018309225)
+	pt2 = curve.multiply(k, pt1)
+	# leaves out the 660367321 subgroup
+	res = pohlig(curve, pt1, pt2, order, limit=10**6)
+	assert res == k
+
+
+def test_pohlig_non_generator():
+	# the point has order n/4, so its 2-part is 2 where the curve has 8
+	a = 23281177685
+	b = 268483880546
+	p = 458893297669
+	order = 458893498728
+	curve = ec_curve(a, b, p)
+	pt1 = curve(266149674375, 251246253524)
+	for _ in range(4):
+		pt2 = curve.multiply(randrange(2, order), pt1)
+		res = pohlig(curve, pt1, pt2, order)
+		assert curve.multiply(res, pt1) == pt2
+	pt2 = curve.multiply(randrange(2, order), pt1)
+	res = pohlig(curve, pt1, pt2, order, workers=2)
+	assert curve.multiply(res, pt1) == pt2
+
+
 if __name__ == "__main__":
 	test_pohlig()
+	test_pohlig_rho()
+	test_pohlig_parallel()
+	test_pohlig_kangaroo()
+	test_pohlig_non_generator()
@@ -1,30 +1,50 @@
 from math import ceil, sqrt
+from multiprocessing import Process
+from multiprocessing import Queue as mpQueue
+from multiprocessing import cpu_count
+from queue import Empty
+from random import randrange
 
 from ec import ec_curve
-
-
-class PRF:
-	def __init__(self, a, b):
-		self.state = ceil(sqrt((b - a)) / 2)
-
-	def get(self, P):
-		if P.is_origin():
-			return 1
-		return int(P.x) % self.state + int(P.y) % self.state + 1
+from utils import gcd
+
+
+class JumpTable:
+	# Jumps of 2^0, 2^1, ..., 2^(k-1) times G, picked by x mod k. k is the
+	# smallest size whose mean jump (2^k - 1)/k reaches `mean`, sqrt(b - a)/2
+	# by default. All jump points are precomputed, so a jump is a single
+	# point addition.
+	def __init__(self, curve, G, a, b, mean=None):
+		if mean is None:
+			mean = sqrt(b - a) / 2
+		k = 1
+		while ((1 << k) - 1) / k < mean:
+			k += 1
+		self.dist = [1 << i for i in range(k)]
+		pts = [curve.to_affine(G)]
+		for _ in range(k - 1):
+			pts.append(curve.jacobian_double(pts[-1]))
+		self.pts = curve.to_affine_many(pts)
+
+	def index(self, P):
+		return P.x % len(self.dist)
 
 
 def pollard_kangaroo(G, curve, F, a, b, N=None):
+	# The tame kangaroo travels about N * sqrt(b - a)/2, so the default trap
+	# sits roughly one interval length past b.
 	if N is None:
-		N = ceil(sqrt(b - a))
-	hash_func = PRF(a, b)
+		N = 2 * ceil(sqrt(b - a))
+	jumps = JumpTable(curve, G, a, b)
 
 	# tame search
 	x_tame = 0
 	y_tame = curve.mult(b, G)
 
 	while N > 0:
-		x_tame += hash_func.get(y_tame)
-		y_tame = curve.add(y_tame, curve.mult(hash_func.get(y_tame), G))
+		j = jumps.index(y_tame)
+		x_tame += jumps.dist[j]
+		y_tame = curve.add(y_tame, jumps.pts[j])
 		N -= 1
 
 	assert y_tame == curve.mult(b + x_tame, G)
@@ -35,8 +55,9 @@ def pollard_kangaroo(G, curve, F, a, b, N=None):
 
 	upper_limit = b - a + x_tame
 	while x_wild < upper_limit:
-		x_wild += hash_func.get(y_wild)
-		y_wild = curve.add(y_wild, curve.mult(hash_func.get(y_wild), G))
+		j = jumps.index(y_wild)
+		x_wild += jumps.dist[j]
+		y_wild = curve.add(y_wild, jumps.pts[j])
 
 		if y_wild == y_tame:
 			return b + x_tame - x_wild
@@ -45,6 +66,97 @@ def pollard_kangaroo(G, curve, F, a, b, N=None):
 	return None
 
 
+def _kangaroo_herd(G, curve, F, a, b, jumps, herd, dp_mask, output):
+	# `herd` tame and `herd` wild kangaroos, all advanced together with one
+	# batched addition per round. Tame distances are logs of their position,
+	# wild distances are offsets from the unknown log of F.
+	half = (b - a) // 2
+
+	def spawn(kind):
+		d = randrange(half + 1)
+		if kind == 0:
+			return (curve.mult(a + half + d, G), a + half + d)
+		return (curve.add(F, curve.mult(d, G)), d)
+
+	kinds = [0] * herd + [1] * herd
+	pts, dists = map(list, zip(*[spawn(kind) for kind in kinds]))
+	seen = {}
+	while True:
+		idx = [jumps.index(pt) for pt in pts]
+		pts = curve.add_many(pts, [jumps.pts[j] for j in idx])
+		for i, j in enumerate(idx):
+			dists[i] += jumps.dist[j]
+			if pts[i].x & dp_mask != 0:
+				continue
+			# two kangaroos of this herd with the same kind met, so they
+			# would walk the same path forever. Send one somewhere else.
+			if seen.get(pts[i]) == kinds[i]:
+				pts[i], dists[i] = spawn(kinds[i])
+				continue
+			seen[pts[i]] = kinds[i]
+			output.put((kinds[i], pts[i], dists[i]))
+
+
+def pollard_kangaroo_parallel(G, curve, F, a, b, workers=None, herd=8, dp_bits=None, timeout=10):
+	# van Oorschot-Wiener: every worker runs a herd of tame and wild kangaroos
+	# and reports distinguished points here. A tame and a wild kangaroo that
+	# land on the same point solve the log, whichever one got there first.
+	# With K kangaroos in total the mean jump is K*sqrt(b - a)/4, and the
+	# expected work is about 2*sqrt(b - a) additions shared by all workers.
+	# Herds report each point once, so in a small group they go quiet; after
+	# `timeout` seconds without a new point, or if a worker died, it gives up.
+	if workers is None:
+		workers = cpu_count()
+	kangaroos = 2 * workers * herd
+	if dp_bits is None:
+		dp_bits = max(0, (b - a).bit_length() // 2 - kangaroos.bit_length() - 3)
+	jumps = JumpTable(curve, G, a, b, mean=kangaroos * sqrt(b - a) / 4)
+	output = mpQueue()
+	args = (G, curve, F, a, b, jumps, herd, (1 << dp_bits) - 1, output)
+	procs = [Process(target=_kangaroo_herd, args=args) for _ in range(workers)]
+	for proc in procs:
+		proc.start()
+	# give up once far more distinguished points than expected came in
+	max_dps = 50 * (ceil(2 * sqrt(b - a)) // (1 << dp_bits) + kangaroos)
+	table = {}
+	# a log found outside [a, b], and a known multiple of the order of G -
+	# the difference of two logs, or of two distances of the same kind
+	found, period = None, 0
+	try:
+		dps, quiet = 0, 0
+		while dps < max_dps:
+			try:
+				kind, pt, dist = output.get(timeout=1)
+			except Empty:
+				quiet += 1
+				if quiet >= timeout or not all(proc.is_alive() for proc in procs):
+					return None
+				continue
+			dps, quiet = dps + 1, 0
+			if pt in table and table[pt][0] != kind:
+				other = table[pt][1]
+				k = dist - other if kind == 0 else other - dist
+				if curve.mult(k, G) == F:
+					if a <= k <= b:
+						return k
+					if found is None:
+						found = k
+					period = gcd(period, k - found)
+			elif pt in table:
+				period = gcd(period, dist - table[pt][1])
+			if found is not None and period != 0:
+				k = a + (found - a) % period
+				if k <= b and curve.mult(k, G) == F:
+					return k
+			table[pt] = (kind, dist)
+		return None
+	finally:
+		for proc in procs:
+			proc.terminate()
+		for proc in procs:
+			proc.join()
+
+
 def test_pollard_kangaroo():
 	a = 0
 	b = 7
@@ -61,5 +173,26 @@ def test_pollard_kangaroo():
 	assert res == k
 
 
+def test_pollard_kangaroo_parallel():
+	a = 2
+	b = 9
+	p = 1035418103
+	curve = ec_curve(a, b, p)
+	G = curve(769278016, 752868328)
+	lo = randrange(0, p)
+	k = lo + randrange(0, 10**6)
+	F = curve.mult(k, G)
+	res = pollard_kangaroo_parallel(G, curve, F, lo, lo + 10**6, workers=2, herd=4)
+	assert res == k
+	# G2 has order 2060, so [0, 2060] wraps and herds soon stop reporting
+	curve = ec_curve(2, 3, 4111)
+	G = curve(2672, 2565)
+	G2 = curve.add(G, G)
+	assert pollard_kangaroo_parallel(G2, curve, curve.mult(1234, G2), 0, 2060, workers=2, timeout=2) == 1234
+	# G is not a multiple of G2
+	assert pollard_kangaroo_parallel(G2, curve, G, 0, 2060, workers=2, timeout=2) is None
+
+
 if __name__ == "__main__":
 	test_pollard_kangaroo()
+	test_pollard_kangaroo_parallel()
@@ -1,7 +1,11 @@
+from multiprocessing import Process
+from multiprocessing import Queue as mpQueue
+from multiprocessing import cpu_count
+from queue import Empty
 from random import randrange
 
-from ec import ec_curve
-from utils import modinv
+from ec import ec_curve, ec_point
+from utils import isqrt, modinv
 
 
 def pollard_rho_step(curve, g, f, n, r, a, b):
@@ -9,20 +13,233 @@ def pollard_rho_step(curve, g, f, n, r, a, b):
 	# into 3 nearly equal parts is acceptable
 	choice = (r.x + r.y) % 3
 	if choice == 0:
-		return (curve.multiply(2, r), (2 * a) % n, (2 * b) % n)
+		return (curve.multiply(2, r, cached=False), (2 * a) % n, (2 * b) % n)
 	elif choice == 1:
 		return (curve.add(f, r), a, b + 1)
 	else:
 		return (curve.add(g, r), a + 1, b)
 
 
-def pollard_rho(curve, g, f, n, init_a=1, init_b=0, max_tries=3):
+class AddingWalk:
+	# Teske's r-adding walk: R -> R + M_j, where M_j = a_j*g + b_j*f is one of
+	# r precomputed points and j is picked from the x coordinate of R.
+	# r around 20 is already close to a truly random walk.
+	def __init__(self, curve, g, f, n, r=20):
+		self.curve = curve
+		self.n = n
+		self.r = r
+		self.coeffs = [(randrange(n), randrange(n)) for _ in range(r)]
+		self.steps = [curve.multi_mult([(a, g), (b, f)]) for a, b in self.coeffs]
+
+	def index(self, pt):
+		return pt.x % self.r
+
+	def step(self, pt, a, b):
+		j = self.index(pt)
+		da, db = self.coeffs[j]
+		return (self.curve.add(pt, self.steps[j]), (a + da) % self.n, (b + db) % self.n)
+
+
+class NegationWalk(AddingWalk):
+	# r-adding walk on classes {P, -P}, represented by the point with the
+	# smaller y. This halves the search space (sqrt(2) fewer steps), but
+	# R -> R + M_j -> -(R + M_j) + M_j = -R gives fruitless 2-cycles (and
+	# rarer longer ones). 2-cycles are caught every step by comparing with
+	# the point two steps back, cycles of up to `lookback` points by
+	# comparing with an anchor point, moved to the walk every `lookback`
+	# steps. Longer ones are left to the caller's cycle detection, which
+	# hands them to escape().
+	def __init__(self, curve, g, f, n, r=32, lookback=8):
+		super().__init__(curve, g, f, n, r)
+		self.half = curve.p // 2
+		self.lookback = lookback
+		self.countdown = lookback
+		self.prev = self.last = self.anchor = None
+
+	def canonical(self, pt, a, b):
+		if pt.y > self.half:
+			return (self.curve.invert(pt), (-a) % self.n, (-b) % self.n)
+		return (pt, a, b)
+
+	def next(self, pt, a, b):
+		j = pt.x % self.r
+		da, db = self.coeffs[j]
+		pt = self.curve.add(pt, self.steps[j])
+		if pt.y > self.half:
+			return (ec_point(pt.x, self.curve.p - pt.y), (-a - da) % self.n, (-b - db) % self.n)
+		return (pt, (a + da) % self.n, (b + db) % self.n)
+
+	def escape(self, entry, length):
+		# leaves the fruitless cycle of at most `length` points through entry
+		# by doubling the cycle point with the smallest x, so every walk that
+		# enters the cycle leaves it the same way. A cycle that only closes
+		# through an earlier escape is left by doubling entry itself.
+		cycle = [entry]
+		nxt = self.next(*entry)
+		while nxt[0] != entry[0] and len(cycle) < length:
+			cycle.append(nxt)
+			nxt = self.next(*nxt)
+		if nxt[0] != entry[0]:
+			cycle = [entry]
+		pt, a, b = min(cycle, key=lambda item: item[0].x)
+		self.prev = self.last = self.anchor = None
+		self.countdown = self.lookback
+		return self.canonical(self.curve.add(pt, pt), (2 * a) % self.n, (2 * b) % self.n)
+
+	def step(self, pt, a, b):
+		pt, a, b = self.next(pt, a, b)
+		if self.prev is not None and self.prev[0] == pt:
+			return self.escape(self.prev, 2)
+		if self.anchor is not None and self.anchor[0] == pt:
+			return self.escape(self.anchor, self.lookback)
+		self.prev, self.last = self.last, (pt, a, b)
+		self.countdown -= 1
+		if self.countdown == 0:
+			self.countdown = self.lookback
+			self.anchor = self.last
+		return (pt, a, b)
+
+
+def pollard_rho_brent(curve, g, f, n, r=20, max_tries=3, negation=False):
+	# r-adding walk with Brent's cycle detection, one addition per iteration.
+	# A try gives up after 20 times the expected number of steps.
+	walk = NegationWalk(curve, g, f, n) if negation else AddingWalk(curve, g, f, n, r)
+	max_steps = 20 * (isqrt(n) + walk.r)
+	for _ in range(max_tries):
+		a, b = randrange(n), randrange(n)
+		pt = curve.multi_mult([(a, g), (b, f)])
+		if negation:
+			pt, a, b = walk.canonical(pt, a, b)
+		t_pt, t_a, t_b = pt, a, b
+		pt, a, b = walk.step(pt, a, b)
+		power = lam = 1
+		exits = {}
+		for _ in range(max_steps):
+			if pt == t_pt:
+				if not negation or (a, b) != (t_a, t_b):
+					break
+				# same point with the same a, b is a fruitless cycle of the
+				# negation walk too long for it to notice, leave it and
+				# start the cycle detection over. In small groups the exit
+				# can lead straight back in. Coming out of the same exit
+				# with other a, b is a collision, with the same ones it
+				# calls for a fresh start.
+				pt, a, b = walk.escape((pt, a, b), lam)
+				if pt in exits:
+					t_pt, (t_a, t_b) = pt, exits[pt]
+					if (t_a, t_b) != (a, b):
+						break
+					a, b = randrange(n), randrange(n)
+					pt, a, b = walk.canonical(curve.multi_mult([(a, g), (b, f)]), a, b)
+				exits[pt] = (a, b)
+				t_pt, t_a, t_b = pt, a, b
+				power = lam = 1
+			# the tortoise teleports to the hare at every power of 2
+			if power == lam:
+				t_pt, t_a, t_b = pt, a, b
+				power *= 2
+				lam = 0
+			pt, a, b = walk.step(pt, a, b)
+			lam += 1
+		else:
+			continue
+		# a*g + b*f = t_a*g + t_b*f  =>  x = (a - t_a)/(t_b - b)
+		if (t_b - b) % n != 0:
+			return ((a - t_a) * modinv(t_b - b, n)) % n
+	return None
+
+
+def _distinguished_walker(walk, g, f, dp_mask, batch, output):
+	# `batch` walks from random starts advance together, one batched addition
+	# (a single inversion) per round. A walk that reaches a distinguished
+	# point (x & dp_mask == 0) reports it and starts over, walks that run 20x
+	# longer than expected are assumed to be stuck in a cycle and restarted.
+	curve, n = walk.curve, walk.n
+	max_len = 20 * (dp_mask + 1)
+
+	def spawn():
+		a, b = randrange(n), randrange(n)
+		return (curve.multi_mult([(a, g), (b, f)]), a, b, 0)
+
+	walks = [spawn() for _ in range(batch)]
+	while True:
+		idx = [walk.index(w[0]) for w in walks]
+		pts = curve.add_many([w[0] for w in walks], [walk.steps[j] for j in idx])
+		for i, (pt, j) in enumerate(zip(pts, idx)):
+			da, db = walk.coeffs[j]
+			a, b, steps = (walks[i][1] + da) % n, (walks[i][2] + db) % n, walks[i][3] + 1
+			if pt.x & dp_mask == 0:
+				output.put((pt, a, b))
+				walks[i] = spawn()
+			elif steps > max_len:
+				walks[i] = spawn()
+			else:
+				walks[i] = (pt, a, b, steps)
+
+
+def pollard_rho_parallel(curve, g, f, n, workers=None, dp_bits=None, r=20, batch=32, max_tries=3, timeout=10):
+	# van Oorschot-Wiener: every worker runs `batch` independent walks over
+	# the same r-adding walk and sends distinguished points here. Two walks
+	# that ever meet end in the same distinguished point, which solves the log.
+	# Gives up with None after max_tries times the expected number of
+	# distinguished points (f not in <g>, or a wrong n), after `timeout`
+	# seconds without a new one, or when a worker died.
+	if workers is None:
+		workers = cpu_count()
+	if dp_bits is None:
+		dp_bits = max(0, n.bit_length() // 4 - 2)
+	walk = AddingWalk(curve, g, f, n, r)
+	output = mpQueue()
+	args = (walk, g, f, (1 << dp_bits) - 1, batch, output)
+	procs = [Process(target=_distinguished_walker, args=args) for _ in range(workers)]
+	for proc in procs:
+		proc.start()
+	max_dps = max_tries * 20 * ((isqrt(n) >> dp_bits) + workers * batch)
+	seen = {}
+	try:
+		dps, quiet = 0, 0
+		while dps < max_dps:
+			try:
+				pt, a, b = output.get(timeout=1)
+			except Empty:
+				quiet += 1
+				if quiet >= timeout or not all(proc.is_alive() for proc in procs):
+					return None
+				continue
+			dps, quiet = dps + 1, 0
+			if pt in seen:
+				t_a, t_b = seen[pt]
+				inv = modinv(t_b - b, n)
+				if inv is not None:
+					k = ((a - t_a) * inv) % n
+					if curve.mult(k, g) == f:
+						return k
+			seen[pt] = (a, b)
+		return None
+	finally:
+		for proc in procs:
+			proc.terminate()
+		for proc in procs:
+			proc.join()
+
+
+def pollard_rho(curve, g, f, n, init_a=1, init_b=0, max_tries=3, mode="floyd", workers=None):
+	# mode "floyd"    - 3-partition walk with floyd cycle detection
+	# mode "brent"    - r-adding walk with brent cycle detection
+	# mode "parallel" - r-adding walks on `workers` processes, distinguished points
+	# mode "negation" - r-adding walk on {P, -P} classes with brent cycle detection
+	if mode == "brent":
+		return pollard_rho_brent(curve, g, f, n, max_tries=max_tries)
+	if mode == "negation":
+		return pollard_rho_brent(curve, g, f, n, max_tries=max_tries, negation=True)
+	if mode == "parallel":
+		return pollard_rho_parallel(curve, g, f, n, workers=workers, max_tries=max_tries)
+	if mode != "floyd":
+		raise ValueError(f"unknown pollard rho mode {mode}")
 	if max_tries == 0:
 		return None
 	# ri1 = ai1*g + bi1*f
-	ag = curve.mult(init_a, g)
-	bf = curve.mult(init_b, f)
-	ag_bf = curve.add(ag, bf)
+	ag_bf = curve.multi_mult([(init_a, g), (init_b, f)])
 	ri1, ai1, bi1 = ag_bf, init_a, init_b
 	ri2, ai2, bi2 = ag_bf, init_a, init_b
 
@@ -64,5 +281,64 @@ def test_pollard_rho():
 	assert res == k
 
 
+def test_pollard_rho_brent():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pt2 = curve.mult(k, pt1)
+	res = pollard_rho(curve, pt1, pt2, order, mode="brent")
+	assert res == k
+
+
+def test_pollard_rho_parallel():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pt2 = curve.mult(k, pt1)
+	res = pollard_rho(curve, pt1, pt2, order, mode="parallel", workers=2)
+	assert res == k
+	# g of order 2060, f not a multiple of it
+	curve = ec_curve(2, 3, 4111)
+	f = curve(2672, 2565)
+	assert pollard_rho(curve, curve.add(f, f), f, 2060, mode="parallel", workers=2) is None
+
+
+def test_pollard_rho_negation():
+	a = 2
+	b = 9
+	p = 1035418103
+	order = 1035356653
+	k = randrange(2, order)
+	curve = ec_curve(a, b, p)
+	pt1 = curve(769278016, 752868328)
+	pt2 = curve.mult(k, pt1)
+	res = pollard_rho(curve, pt1, pt2, order, mode="negation")
+	assert res == k
+	# small prime order subgroups, where fruitless cycles longer than the
+	# walk's lookback are common
+	for p, q in [(5059, 269), (5077, 229), (5119, 103), (5153, 281), (5189, 157), (5227, 257), (5309, 151),
+	             (5351, 101), (5381, 131), (5393, 107), (5399, 227), (5417, 179)]:
+		curve = ec_curve(1, 7, p)
+		g = curve.origin()
+		while g.is_origin():
+			pts = curve.from_x(randrange(p))
+			if len(pts) != 0:
+				g = curve.mult(curve.cardinality() // q, pts[0])
+		for _ in range(100):
+			k = randrange(1, q)
+			assert pollard_rho(curve, g, curve.mult(k, g), q, mode="negation") == k
+
+
 if __name__ == "__main__":
 	test_pollard_rho()
+	test_pollard_rho_brent()
+	test_pollard_rho_parallel()
+	test_pollard_rho_negation()
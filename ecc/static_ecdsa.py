@@ -1,12 +1,14 @@
 from collections import namedtuple
 from hashlib import new as new_hash
+from itertools import islice
 from random import randrange
-from typing import Callable
+from secrets import randbelow
+from typing import Callable, Iterable
 
 from hashpumpy import hashpump
 
-from ec import ec_curve, ec_point
-from utils import b2i, i2b, modinv
+from ec import comb_table, ec_curve, ec_point
+from utils import b2i, batch_modinv, i2b, modinv
 
 Public_key = namedtuple("Public_key", "gen order curve_pt")
 Private_key = namedtuple("Private_key", "gen order secret")
@@ -14,7 +16,7 @@ Signature = namedtuple("Signature", "r s")
 
 
 def ecdsa_gen_keys(curve: ec_curve, gen: ec_point, order: int, secret: int):
-	curve_pt = curve.mult(secret, gen)
+	curve_pt = curve.mult_fixed(secret, gen)
 	public_key = Public_key(gen, order, curve_pt)
 	private_key = Private_key(gen, order, secret)
 	return public_key, private_key
@@ -32,14 +34,107 @@ def ecdsa_verify(curve: ec_curve, pub_key: Public_key, msg_hash: bytes, signatur
 	c = modinv(s, order)
 	a1 = (msg_hash * c) % order
 	a2 = (r * c) % order
-	xy = curve.add(curve.mult(a1, gen), curve.mult(a2, curve_pt))
+	xy = curve.multi_mult([(a1, gen), (a2, curve_pt)])
 	ver = xy.x % order
 	return r == ver
 
 
+# signatures checked together by one random linear combination
+BATCH_GROUP = 8
+# bits of security the combined check must give, orders too small for it
+# are verified one signature at a time
+BATCH_SECURITY = 128
+
+
+def _ecdsa_verify_one(curve: ec_curve, item: tuple, c: int):
+	pub_key, msg_hash, (r, _) = item
+	gen, order, curve_pt = pub_key
+	xy = comb_table(curve, gen, curve.p.bit_length() + 1).multiply_jacobian((msg_hash * c) % order)
+	xy = curve.to_affine(curve.jacobian_add(xy, curve.multiply_jacobian((r * c) % order, curve_pt, cached=False)))
+	return not xy.is_origin() and r == xy.x % order
+
+
+def _ecdsa_verify_group(curve: ec_curve, group: list):
+	# Every valid signature has u1*G + u2*Q = e*R, with R recovered from r and
+	# an unknown sign e. With random 64 bit z, sum(z*u1)*G + sum(z*u2*Q) is
+	# compared against sum(e*z*R) for every choice of signs, meet in the
+	# middle, so the ladders over the public keys share their doublings
+	# (one interleaved multiplication) and G costs a single comb.
+	# z only matters mod the order, and each of the 2^len(group) sign choices
+	# is another chance to match, so a bad group gets through with probability
+	# about 2^len(group) / min(order, range of z). Callers only group
+	# signatures whose order is at least BATCH_SECURITY + BATCH_GROUP bits,
+	# z is drawn from as many bits, which keeps that under 2^-BATCH_SECURITY.
+	# z must not be predictable, hence secrets rather than random.
+	gens, pubs, pts = {}, {}, []
+	for (pub_key, msg_hash, (r, _)), c in group:
+		gen, order, curve_pt = pub_key
+		candidates = curve.from_x(r)
+		if len(candidates) == 0:
+			return False
+		z = randbelow(min(order, 1 << (BATCH_SECURITY + BATCH_GROUP)) - 1) + 1
+		gens[gen, order] = (gens.get((gen, order), 0) + z * msg_hash * c) % order
+		pubs[curve_pt, order] = (pubs.get((curve_pt, order), 0) + z * r * c) % order
+		pts.append(curve.multiply_jacobian(z, candidates[0], cached=False))
+	total = curve.multi_multiply_jacobian([(k, pt) for (pt, _), k in pubs.items()], cached=False)
+	for (gen, _), k in gens.items():
+		total = curve.jacobian_add(total, comb_table(curve, gen, curve.p.bit_length() + 1).multiply_jacobian(k))
+	half = len(pts) // 2
+	left, right = [total], [curve.origin()]
+	for pt in pts[:half]:
+		left = [curve.jacobian_add(acc, q) for acc in left for q in (pt, curve.invert(pt))]
+	for pt in pts[half:]:
+		right = [curve.jacobian_add(acc, q) for acc in right for q in (pt, curve.invert(pt))]
+	return not set(curve.to_affine_many(left)).isdisjoint(curve.to_affine_many(right))
+
+
+def _ecdsa_verify_chunk(curve: ec_curve, chunk: list):
+	results = [False] * len(chunk)
+	# s^-1 for every signature, one inversion per distinct group order
+	by_order = {}
+	for i, (pub_key, _, (r, s)) in enumerate(chunk):
+		order = pub_key.order
+		if 1 <= r <= order - 1 and 1 <= s <= order - 1:
+			by_order.setdefault(order, []).append(i)
+	todo = []
+	for order, idxs in by_order.items():
+		s_invs = batch_modinv([chunk[i][2][1] for i in idxs], order)
+		for i, c in zip(idxs, s_invs):
+			# from_x would reduce r >= p and recover a point whose x is not r,
+			# and small orders leave the combined check open to forgeries
+			if chunk[i][2][0] >= curve.p or order.bit_length() < BATCH_SECURITY + BATCH_GROUP:
+				results[i] = _ecdsa_verify_one(curve, chunk[i], c)
+			else:
+				todo.append((i, c))
+	# signatures under the same key end up in the same group, where their
+	# public key terms merge into one
+	todo.sort(key=lambda entry: (chunk[entry[0]][0].curve_pt, chunk[entry[0]][0].gen))
+	for start in range(0, len(todo), BATCH_GROUP):
+		group = todo[start:start + BATCH_GROUP]
+		if _ecdsa_verify_group(curve, [(chunk[i], c) for i, c in group]):
+			for i, _ in group:
+				results[i] = True
+		else:
+			# at least one bad signature, find it the slow way
+			for i, c in group:
+				results[i] = _ecdsa_verify_one(curve, chunk[i], c)
+	return results
+
+
+def ecdsa_verify_batch(curve: ec_curve, items: Iterable, chunk_size: int = 256):
+	# items are (pub_key, msg_hash, signature) tuples. Yields one result per
+	# item, reading at most chunk_size items ahead, so it can stream.
+	items = iter(items)
+	while True:
+		chunk = list(islice(items, chunk_size))
+		if len(chunk) == 0:
+			return
+		yield from _ecdsa_verify_chunk(curve, chunk)
+
+
 def ecdsa_sign(curve: ec_curve, priv_key: Private_key, msg_hash: int, nonce: int):
 	gen, order, secret = priv_key
-	p = curve.mult(nonce, gen)
+	p = curve.mult_fixed(nonce, gen)
 	r = p.x % order
 	if r == 0:
 		raise ValueError("Got r=0. Unlucky.")
@@ -98,7 +193,7 @@ def get_test_curve256():
 
 
 def test_static_ecdsa():
-	msg = bytes(randrange(0, 257) for _ in range(randrange(10, 30)))
+	msg = bytes(randrange(0, 256) for _ in range(randrange(10, 30)))
 	curve, G, order = get_test_curve256()
 	k = randrange(2, curve.p - 1)
 	pubkey, privkey = ecdsa_gen_keys(curve, G, order, k)
@@ -106,5 +201,48 @@ def test_static_ecdsa():
 	assert ecdsa_verify(curve, pubkey, insecure_hash(b'', msg), sig)
 
 
+def test_ecdsa_verify_batch():
+	curve, G, order = get_test_curve256()
+	items = []
+	for _ in range(12):
+		msg = bytes(randrange(0, 256) for _ in range(randrange(10, 30)))
+		pubkey, privkey = ecdsa_gen_keys(curve, G, order, randrange(2, order))
+		sig = ecdsa_sign_static(curve, privkey, msg, insecure_hash)
+		msg_hash = insecure_hash(b'', msg)
+		items.append((pubkey, msg_hash, sig))
+		items.append((pubkey, msg_hash + 1, sig))
+		items.append((pubkey, msg_hash, Signature(sig.r, 0)))
+	expected = [ecdsa_verify(curve, *item) for item in items]
+	assert expected.count(True) == 12
+	assert list(ecdsa_verify_batch(curve, iter(items), chunk_size=5)) == expected
+	# full groups that pass the combined check, keys repeated across them
+	valid = [item for item, ok in zip(items, expected) if ok] * 2
+	assert all(ecdsa_verify_batch(curve, valid))
+	pub_key, msg_hash, sig = valid[5]
+	valid[5] = (pub_key, msg_hash, Signature(sig.r, sig.s + 1))
+	assert list(ecdsa_verify_batch(curve, valid)) == [i != 5 for i in range(len(valid))]
+	# group order above p, so r = R.x + p is in range but must not verify
+	curve = ec_curve(37, 1, 10007, 10163)
+	G = curve.from_x(next(x for x in range(1, 10007) if len(curve.from_x(x)) != 0))[0]
+	pubkey, privkey = ecdsa_gen_keys(curve, G, 10163, 1234)
+	items = []
+	for nonce in range(2, 200):
+		R = curve.mult_fixed(nonce, G)
+		if R.x + curve.p < 10163:
+			r = R.x + curve.p
+			items.append((pubkey, 99, Signature(r, modinv(nonce, 10163) * (99 + 1234 * r) % 10163)))
+	items.append((pubkey, 99, ecdsa_sign(curve, privkey, 99, 5)))
+	assert len(items) > 1
+	assert [ecdsa_verify(curve, *item) for item in items] == [False] * (len(items) - 1) + [True]
+	assert list(ecdsa_verify_batch(curve, items)) == [False] * (len(items) - 1) + [True]
+	# random garbage on a small order, where a combined check would let
+	# whole groups of forgeries through
+	keys = [ecdsa_gen_keys(curve, G, 10163, randrange(2, 10163))[0] for _ in range(3)]
+	items = [(keys[i % 3], randrange(1, 10163), Signature(randrange(1, 10163), randrange(1, 10163))) for i in range(3000)]
+	items += [(pubkey, 99, ecdsa_sign(curve, privkey, 99, nonce)) for nonce in range(2, 20)]
+	assert list(ecdsa_verify_batch(curve, items)) == [ecdsa_verify(curve, *item) for item in items]
+
+
 if __name__ == "__main__":
 	test_static_ecdsa()
+	test_ecdsa_verify_batch()
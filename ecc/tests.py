@@ -1,16 +1,43 @@
-from bsgs import test_bsgs
-from pohlig import test_pohlig
-from pollard_kangaroo import test_pollard_kangaroo
-from pollard_rho import test_pollard_rho
+from bernstein_lange import test_bernstein_lange
+from bsgs import test_bsgs, test_bsgs_compact, test_bsgs_disk, test_bsgs_interleaved, test_bsgs_many
+from ec import test_add_many, test_cardinality, test_fixed_base, test_jacobian, test_multi_mult, test_windowed_multiply
+from kuhn_struik import test_kuhn_struik
+from pohlig import test_pohlig, test_pohlig_kangaroo, test_pohlig_non_generator, test_pohlig_parallel, test_pohlig_rho
+from pollard_kangaroo import test_pollard_kangaroo, test_pollard_kangaroo_parallel
+from pollard_rho import test_pollard_rho, test_pollard_rho_brent, test_pollard_rho_negation, test_pollard_rho_parallel
 from smart import test_smart
+from static_ecdsa import test_ecdsa_verify_batch, test_static_ecdsa
+from utils.factors import test_ecm
 
 tests = {
+    "JACOBIAN_ARITHMETIC": test_jacobian,
+    "WINDOWED_MULTIPLY": test_windowed_multiply,
+    "FIXED_BASE_MULTIPLY": test_fixed_base,
+    "MULTI_SCALAR_MULTIPLY": test_multi_mult,
+    "BATCHED_ADDITION": test_add_many,
+    "POINT_COUNTING": test_cardinality,
+    "ECM_FACTORING": test_ecm,
     "BABY_STEP_GIANT_STEP": test_bsgs,
+    "BABY_STEP_GIANT_STEP_COMPACT": test_bsgs_compact,
+    "BABY_STEP_GIANT_STEP_MANY": test_bsgs_many,
+    "BABY_STEP_GIANT_STEP_DISK": test_bsgs_disk,
+    "BABY_STEP_GIANT_STEP_INTERLEAVED": test_bsgs_interleaved,
     "POHLIG_HELLMAN": test_pohlig,
+    "POHLIG_HELLMAN_RHO": test_pohlig_rho,
+    "POHLIG_HELLMAN_PARALLEL": test_pohlig_parallel,
+    "POHLIG_HELLMAN_KANGAROO": test_pohlig_kangaroo,
+    "POHLIG_HELLMAN_NON_GENERATOR": test_pohlig_non_generator,
     "SMART": test_smart,
     "POLLARD_RHO": test_pollard_rho,
+    "POLLARD_RHO_BRENT": test_pollard_rho_brent,
+    "POLLARD_RHO_PARALLEL": test_pollard_rho_parallel,
+    "POLLARD_RHO_NEGATION": test_pollard_rho_negation,
+    "KUHN_STRUIK_MULTI_TARGET": test_kuhn_struik,
     "POLLARD_KANGAROO": test_pollard_kangaroo,
-	"STATIC_ECDSA": 
+    "POLLARD_KANGAROO_PARALLEL": test_pollard_kangaroo_parallel,
+    "BERNSTEIN_LANGE_KANGAROO": test_bernstein_lange,
+    "STATIC_ECDSA": test_static_ecdsa,
+    "ECDSA_BATCH_VERIFY": test_ecdsa_verify_batch,
 }
 
 
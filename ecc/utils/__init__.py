@@ -1,4 +1,5 @@
 from utils.factors import *
 from utils.number_theory import *
 from utils.polynomials import *
+from utils.point_counting import *
 from utils.conversions import *
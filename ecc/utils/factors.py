@@ -1,9 +1,11 @@
 from itertools import count
 from multiprocessing import Process
 from multiprocessing import Queue as mpQueue
+from multiprocessing import active_children
+from multiprocessing import cpu_count
 from random import randrange
 
-from .number_theory import gcd, ilog, ispower, isprime, isqrt, primegen
+from .number_theory import gcd, ilog, ispower, isprime, isqrt, modinv, primegen
 
 
 def pollardrho_brent(n):
@@ -84,6 +86,108 @@ def williams_pp1(n):
 				break
 
 
+# (B1, curves) per level, roughly the usual tables for factors of 15, 20,
+# 25, 30, 35 and 40 digits. Stage 2 runs up to 100*B1.
+ECM_SCHEDULE = ((2000, 25), (11000, 90), (50000, 300), (250000, 700), (1000000, 1800), (3000000, 5100))
+
+
+def ecm_curve(n):
+	# random Montgomery curve By^2 = x^3 + Ax^2 + x with Suyama's sigma, which
+	# makes the group order divisible by 12. Returns ((A + 2) / 4, (X : Z))
+	# or a factor of n found while inverting.
+	sigma = randrange(6, n - 1)
+	u, v = (sigma * sigma - 5) % n, (4 * sigma) % n
+	den = 16 * pow(u, 3, n) * v % n
+	g = gcd(den, n)
+	if g != 1:
+		return g
+	a24 = pow(v - u, 3, n) * (3 * u + v) * modinv(den, n) % n
+	return (a24, (pow(u, 3, n), pow(v, 3, n)))
+
+
+def ecm_double(P, a24, n):
+	s, d = (P[0] + P[1])**2 % n, (P[0] - P[1])**2 % n
+	t = s - d
+	return (s * d % n, t * (d + a24 * t) % n)
+
+
+def ecm_add(P, Q, diff, n):
+	# x only addition, needs P - Q
+	u, v = (P[0] - P[1]) * (Q[0] + Q[1]) % n, (P[0] + P[1]) * (Q[0] - Q[1]) % n
+	return (diff[1] * (u + v)**2 % n, diff[0] * (u - v)**2 % n)
+
+
+def ecm_ladder(k, P, a24, n):
+	# Montgomery ladder, keeps (kP, (k + 1)P) so the difference is always P
+	R0, R1 = P, ecm_double(P, a24, n)
+	for bit in bin(k)[3:]:
+		if bit == "1":
+			R0, R1 = ecm_add(R1, R0, P, n), ecm_double(R1, a24, n)
+		else:
+			R0, R1 = ecm_double(R0, a24, n), ecm_add(R1, R0, P, n)
+	return R0
+
+
+def ecm_stage2(Q, a24, n, B1, B2):
+	# Baby steps S[d] = 2d*Q, giant steps R = r*Q with r += 2D. For every
+	# prime q = r + 2d, X_R*Z_S - X_S*Z_R vanishes mod p when qQ = 0 mod p,
+	# and all of them go into one product before a single gcd.
+	r = B1 - 1 if B1 % 2 == 0 else B1
+	D = max(2, min(isqrt(B2 // 2), (r - 1) // 4))
+	S = [None, ecm_double(Q, a24, n)]
+	S.append(ecm_double(S[1], a24, n))
+	for d in range(3, D + 1):
+		S.append(ecm_add(S[d - 1], S[1], S[d - 2], n))
+	beta = [None] + [X * Z % n for (X, Z) in S[1:]]
+	R, T = ecm_ladder(r, Q, a24, n), ecm_ladder(r - 2 * D, Q, a24, n)
+	pg, g = primegen(), 1
+	q = next(pg)
+	while q <= r:
+		q = next(pg)
+	while r < B2:
+		alpha = R[0] * R[1] % n
+		while q <= r + 2 * D:
+			X, Z = S[(q - r) // 2]
+			g = g * ((R[0] - X) * (R[1] + Z) - alpha + beta[(q - r) // 2]) % n
+			q = next(pg)
+		R, T, r = ecm_add(R, S[D], T, n), R, r + 2 * D
+	return gcd(g, n)
+
+
+def ecm(n, schedule=ECM_SCHEDULE):
+	# Lenstra's elliptic curve method. Each curve gets stage 1 (multiply by
+	# every prime power up to B1) and stage 2 (one more prime up to 100*B1).
+	# Bounds follow `schedule`, the last level repeats until a factor shows.
+	if isprime(n):
+		return n
+	if n % 2 == 0:
+		return 2
+	m = ispower(n)
+	if m:
+		return m[0]
+	for i in count():
+		B1, curves = schedule[min(i, len(schedule) - 1)]
+		for _ in range(curves):
+			res = ecm_curve(n)
+			if not isinstance(res, tuple):
+				if res != n:
+					return res
+				continue
+			a24, Q = res
+			for p in primegen(B1 + 1):
+				Q = ecm_ladder(p**ilog(B1, p), Q, a24, n)
+			g = gcd(Q[1], n)
+			if g == 1:
+				g = ecm_stage2(Q, a24, n, B1, 100 * B1)
+			if 1 < g < n:
+				return g
+
+
+def ecm_parallel(n, workers=None):
+	# independent curves on every core, the first factor found wins
+	return multifactor(n, methods=[ecm] * (workers or cpu_count()))
+
+
 def multifactor(n, methods):
 	def factory(method, n, output):
 		output.put(method(n))
@@ -95,6 +199,8 @@ def multifactor(n, methods):
 	f = factors.get()
 	for p in procs:
 		p.terminate()
+	for p in procs:
+		p.join()
 	return f
 
 
@@ -174,3 +280,12 @@ def factorint(n, trial=1000, rho=42000, methods=(pollardrho_brent, )):
 	for p in primefac(n, trial=trial, rho=rho, methods=methods):
 		fac[p] = fac.get(p, 0) + 1
 	return fac
+
+
+def test_ecm():
+	# 15 digit factors, far beyond what factorint's rho budget reaches
+	p, q = 100000000000031, 300000000000089
+	assert ecm(p * q) in (p, q)
+	assert factorint(12 * p * q, rho=0, methods=(ecm, )) == {2: 2, 3: 1, p: 1, q: 1}
+	assert factorint(p * q, rho=0, methods=(ecm, ecm)) == {p: 1, q: 1}
+	assert active_children() == []
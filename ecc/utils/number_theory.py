@@ -41,6 +41,22 @@ def modinv(a, m):
 	return x % m
 
 
+def batch_modinv(values, m):
+	# Montgomery's trick - inverts every value with a single modinv
+	prefix, acc = [], 1
+	for v in values:
+		prefix.append(acc)
+		acc = (acc * v) % m
+	inv = modinv(acc, m)
+	if inv is None:
+		return None
+	res = [0] * len(prefix)
+	for i in range(len(prefix) - 1, -1, -1):
+		res[i] = (inv * prefix[i]) % m
+		inv = (inv * values[i]) % m
+	return res
+
+
 def iterprod(l):
 	z = 1
 	for x in l:
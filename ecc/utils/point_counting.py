@@ -0,0 +1,202 @@
+from .number_theory import crt, isqrt, legendre, modinv, primegen
+from .polynomials import gcmd, poly_barrett, polyaddmodp, polymulmodp, polypowmodpmodpoly, polysubmodp, polyxgcdmodp
+
+try:
+	import numpy as np
+except ImportError:
+	np = None
+
+
+class DivisionPolynomials:
+	# psi_n of y^2 = x^3 + ax + b over F_p, kept as polynomials in x only -
+	# psi_n itself for odd n and psi_n / y for even n, so y^2 is replaced
+	# by F = x^3 + ax + b wherever the recurrences need it
+	def __init__(self, a, b, p):
+		self.p = p
+		self.F = polyaddmodp([b, a, 0, 1], [], p)
+		self.F2 = polymulmodp(self.F, self.F, p)
+		self.cache = {
+		    0: [],
+		    1: [1],
+		    2: [2 % p],
+		    3: polyaddmodp([-a * a, 12 * b, 6 * a, 0, 3], [], p),
+		    4: polyaddmodp([-4 * a**3 - 32 * b * b, -16 * a * b, -20 * a * a, 80 * b, 20 * a, 0, 4], [], p),
+		}
+
+	def __call__(self, n):
+		if n in self.cache:
+			return self.cache[n]
+		p, mul = self.p, self.mul
+		m = n // 2
+		if n & 1:
+			left = mul(self(m + 2), self(m), self(m), self(m))
+			right = mul(self(m - 1), self(m + 1), self(m + 1), self(m + 1))
+			if m & 1:
+				right = mul(right, self.F2)
+			else:
+				left = mul(left, self.F2)
+			res = polysubmodp(left, right, p)
+		else:
+			inner = polysubmodp(mul(self(m + 2), self(m - 1), self(m - 1)), mul(self(m - 2), self(m + 1), self(m + 1)), p)
+			res = mul(self(m), inner, [modinv(2, p)])
+		self.cache[n] = res
+		return res
+
+	def mul(self, *polys):
+		res = [1]
+		for f in polys:
+			res = polymulmodp(res, f, self.p)
+		return res
+
+
+class Split(Exception):
+	# raised with a proper factor of the modulus when a ring element that
+	# had to be inverted turns out to be a zero divisor
+	def __init__(self, factor):
+		self.factor = factor
+
+
+class TorsionRing:
+	# Points (X(x), Y(x)*y) of E over F_p[x]/(h), h a factor of psi_l. Only
+	# the parts of the group law that Schoof's algorithm needs.
+	def __init__(self, a, p, F, h):
+		self.a = a
+		self.p = p
+		self.h = h
+		self.barrett = poly_barrett(h, p)
+		self.F = self.barrett.reduce(F)
+
+	def red(self, f):
+		return self.barrett.reduce(f)
+
+	def mul(self, f, g):
+		return self.barrett.mul(f, g)
+
+	def inv(self, f):
+		g, s = polyxgcdmodp(f, self.h, self.p)
+		if g != [1]:
+			raise Split(g)
+		return s
+
+	def pow(self, f, e):
+		return self.barrett.pow(f, e)
+
+	def double(self, P):
+		if P is None or P[1] == []:
+			return None
+		p, X, Y = self.p, P[0], P[1]
+		# lambda = y * (3X^2 + a) / (2 * Y * F)
+		num = polyaddmodp(self.mul([3], self.mul(X, X)), [self.a], p)
+		lam = self.mul(num, self.inv(self.mul([2], self.mul(Y, self.F))))
+		X3 = polysubmodp(self.mul(self.F, self.mul(lam, lam)), self.mul([2], X), p)
+		Y3 = polysubmodp(self.mul(lam, polysubmodp(X, X3, p)), Y, p)
+		return (X3, Y3)
+
+	def add(self, P, Q):
+		if P is None:
+			return Q
+		if Q is None:
+			return P
+		p = self.p
+		(X1, Y1), (X2, Y2) = P, Q
+		dx = polysubmodp(X2, X1, p)
+		if dx == []:
+			dy = polysubmodp(Y2, Y1, p)
+			if dy == []:
+				return self.double(P)
+			if polyaddmodp(Y1, Y2, p) == []:
+				return None
+			# P = Q over some factors of h and P = -Q over the others
+			raise Split(gcmd(dy, self.h, p))
+		# lambda = y * (Y2 - Y1) / (X2 - X1)
+		lam = self.mul(polysubmodp(Y2, Y1, p), self.inv(dx))
+		X3 = polysubmodp(polysubmodp(self.mul(self.F, self.mul(lam, lam)), X1, p), X2, p)
+		Y3 = polysubmodp(self.mul(lam, polysubmodp(X1, X3, p)), Y1, p)
+		return (X3, Y3)
+
+	def mult(self, n, P):
+		res = None
+		for k in bin(n)[2:]:
+			res = self.double(res)
+			if k == '1':
+				res = self.add(res, P)
+		return res
+
+
+def frobenius_trace_mod(l, a, p, psi):
+	# t mod l from pi^2(P) + (p mod l)P = t*pi(P) on the l-torsion, working
+	# modulo psi_l, or modulo a factor of it whenever one shows up
+	h = psi(l)
+	h = polymulmodp(h, [modinv(h[-1], p)], p)
+	while True:
+		ring = TorsionRing(a, p, psi.F, h)
+		try:
+			xp = ring.pow([0, 1], p)
+			yp = ring.pow(psi.F, (p - 1) // 2)
+			frob = (xp, yp)
+			frob2 = (ring.pow(xp, p), ring.mul(ring.pow(yp, p), yp))
+			rhs = ring.add(frob2, ring.mult(p % l, (ring.red([0, 1]), [1])))
+			if rhs is None:
+				return 0
+			T = frob
+			for t in range(1, (l + 1) // 2):
+				if T[0] == rhs[0]:
+					if T[1] == rhs[1]:
+						return t
+					if polyaddmodp(T[1], rhs[1], p) == []:
+						return l - t
+					raise Split(gcmd(polysubmodp(T[1], rhs[1], p), h, p))
+				T = ring.add(T, frob)
+			raise ArithmeticError(f"no trace found modulo {l}")
+		except Split as e:
+			h = e.factor
+
+
+def schoof(a, b, p):
+	# #E(F_p) for y^2 = x^3 + ax + b, p > 3, from t mod l for small primes l
+	# until their product exceeds the Hasse interval 4*sqrt(p). No Elkies or
+	# Atkin improvements, so this is practical up to roughly 100 bits (about
+	# 2 minutes there) and hopeless at cryptographic sizes.
+	a, b = a % p, b % p
+	psi = DivisionPolynomials(a, b, p)
+	# l = 2 - t is even iff F has a root, i.e. E has a point of order 2
+	xp = polypowmodpmodpoly([0, 1], p, p, psi.F)
+	rems, mods = [0 if len(gcmd(polysubmodp(xp, [0, 1], p), psi.F, p)) > 1 else 1], [2]
+	bound, prod = 4 * (isqrt(p) + 1), 2
+	for l in primegen():
+		if prod > bound:
+			break
+		if l == 2 or l == p:
+			continue
+		rems.append(frobenius_trace_mod(l, a, p, psi))
+		mods.append(l)
+		prod *= l
+	t = crt(rems, mods)
+	if t > prod // 2:
+		t -= prod
+	return p + 1 - t
+
+
+def count_points(a, b, p, chunk=1 << 16):
+	# #E(F_p) as 1 + sum over x of (1 + legendre(x^3 + ax + b)), no points
+	# or square roots involved. x runs through chunks of `chunk` values, so
+	# memory stays bounded for any p. With numpy a chunk is an int64 array
+	# and Euler's criterion is evaluated on all of it at once (needs p < 2^31
+	# so products stay below 2^62), otherwise legendre is called per x.
+	a, b = a % p, b % p
+	total = 1
+	for start in range(0, p, chunk):
+		stop = min(start + chunk, p)
+		if np is None or p >= 1 << 31:
+			total += sum(1 + legendre(x * x * x + a * x + b, p) for x in range(start, stop))
+			continue
+		x = np.arange(start, stop, dtype=np.int64)
+		f = ((x * x % p) * x % p + a * x % p + b) % p
+		res, base, e = np.ones_like(f), f.copy(), (p - 1) // 2
+		while e:
+			if e & 1:
+				res = res * base % p
+			base = base * base % p
+			e >>= 1
+		total += 2 * int(np.count_nonzero(res == 1)) + int(np.count_nonzero(f == 0))
+	return total
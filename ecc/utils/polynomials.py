@@ -22,9 +22,14 @@ def polysubmodp(a, b, p):
 	return c
 
 
+KRONECKER_THRESHOLD = 24
+
+
 def polymulmodp(a, b, p):
 	if a is None or b is None:
 		return None
+	if min(len(a), len(b)) >= KRONECKER_THRESHOLD:
+		return polymulmodp_kronecker(a, b, p)
 	c = [0] * (len(a) + len(b) - 1)
 	for (k, x) in enumerate(a):
 		for (l, y) in enumerate(b):
@@ -36,20 +41,43 @@ def polymulmodp(a, b, p):
 	return c
 
 
+def polymulmodp_kronecker(a, b, p):
+	# Kronecker substitution - pack both polynomials into integers with one
+	# k-byte slot per coefficient, wide enough that no product coefficient
+	# spills over, and let the big integer multiply (Karatsuba/Toom-3 in
+	# CPython) do the work. Coefficients are then read back slot by slot.
+	if len(a) == 0 or len(b) == 0:
+		return []
+	a, b = [x % p for x in a], [x % p for x in b]
+	k = (2 * p.bit_length() + min(len(a), len(b)).bit_length() + 8) // 8
+	x = int.from_bytes(b"".join(c.to_bytes(k, "little") for c in a), "little")
+	y = x if a == b else int.from_bytes(b"".join(c.to_bytes(k, "little") for c in b), "little")
+	n = len(a) + len(b) - 1
+	raw = (x * y).to_bytes(k * n, "little")
+	c = [int.from_bytes(raw[i:i + k], "little") % p for i in range(0, k * n, k)]
+	while len(c) > 0 and c[-1] == 0:
+		del c[-1]
+	return c
+
+
 def polydivmodmodp(a, b, p):
 	if a is None or b is None or b == []:
 		return (None, None)
 	ndeg, ddeg = len(a) - 1, len(b) - 1
 	if ndeg < ddeg:
 		return ([], a[:])
-	num, den = a[:], b[:]
 	c = modinv(b[-1], p)
 	if c is None:
 		return (None, None)
-	term = [0] * (ndeg - ddeg) + [(num[-1] * c) % p]
-	newnum = polysubmodp(num, polymulmodp(den, term, p), p)
-	quo, rem = polydivmodmodp(newnum, den, p)
-	quo = polyaddmodp(term, quo, p)
+	# schoolbook long division, one quotient term per pass
+	rem = [x % p for x in a]
+	quo = [0] * (ndeg - ddeg + 1)
+	for i in range(ndeg - ddeg, -1, -1):
+		q = (rem[i + ddeg] * c) % p
+		quo[i] = q
+		if q != 0:
+			rem[i:i + ddeg + 1] = [(r - q * y) % p for (r, y) in zip(rem[i:i + ddeg + 1], b)]
+	del rem[ddeg:]
 	while len(quo) > 0 and quo[-1] == 0:
 		del quo[-1]
 	while len(rem) > 0 and rem[-1] == 0:
@@ -57,15 +85,42 @@ def polydivmodmodp(a, b, p):
 	return (quo, rem)
 
 
+class poly_barrett:
+	# Reduction modulo a fixed f of degree n over F_p. mu = x^2n // f is
+	# computed once, after that a product of degree < 2n is reduced with two
+	# multiplications instead of a long division:
+	# a // f = ((a // x^n) * mu) // x^n
+	def __init__(self, f, p):
+		self.p = p
+		self.f = polyaddmodp(f, [], p)
+		self.n = len(self.f) - 1
+		self.mu = polydivmodmodp([0] * (2 * self.n) + [1], self.f, p)[0]
+
+	def reduce(self, a):
+		n, p = self.n, self.p
+		if len(a) <= n:
+			return polyaddmodp(a, [], p)
+		if len(a) > 2 * n:
+			return polydivmodmodp(a, self.f, p)[1]
+		q = polymulmodp(a[n:], self.mu, p)[n:]
+		return polysubmodp(a[:n], polymulmodp(q, self.f, p)[:n], p)
+
+	def mul(self, a, b):
+		return self.reduce(polymulmodp(a, b, self.p))
+
+	def pow(self, a, e):
+		ans, a = [1], self.reduce(a)
+		for k in bin(e)[2:]:
+			ans = self.mul(ans, ans)
+			if k == '1':
+				ans = self.mul(ans, a)
+		return ans
+
+
 def polypowmodpmodpoly(a, e, p, f):  # a**e mod p mod f
 	if a is None or f is None or f == []:
 		return None
-	ans, a = [1], polydivmodmodp(a, f, p)[1]
-	for k in bin(e)[2:]:
-		ans = polydivmodmodp(polymulmodp(ans, ans, p), f, p)[1]
-		if k == '1':
-			ans = polydivmodmodp(polymulmodp(ans, a, p), f, p)[1]
-	return ans
+	return poly_barrett(f, p).pow(a, e)
 
 
 def gcmd(f, g, p):
@@ -87,6 +142,18 @@ def gcmd(f, g, p):
 	return [(x * c) % p for x in u]
 
 
+def polyxgcdmodp(a, f, p):
+	# (g, s) with g = gcd(a, f) monic and s*a = g mod f
+	r0, r1 = f[:], polydivmodmodp(a, f, p)[1]
+	s0, s1 = [], [1]
+	while r1 != []:
+		q, r = polydivmodmodp(r0, r1, p)
+		r0, r1 = r1, r
+		s0, s1 = s1, polysubmodp(s0, polymulmodp(q, s1, p), p)
+	c = modinv(r0[-1], p)
+	return ([(x * c) % p for x in r0], [(x * c) % p for x in s0])
+
+
 def polyval(f, x, m=None):
 	out = 0
 	if m is None:
@@ -116,6 +183,11 @@ def polyroots_prime(f, p, sqfr=False):
 	if g == []:
 		yield from range(p)
 		return
+	yield from _polyroots_split(g, p)
+
+
+def _polyroots_split(g, p):
+	# roots of a squarefree g over F_p, p already known to be prime
 	if g[0] == 0:
 		yield 0
 		while g[0] == 0:
@@ -142,11 +214,11 @@ def polyroots_prime(f, p, sqfr=False):
 		inv2 = (p + 1) // 2  # inv2 == modinv(2, p)
 		yield from {((-b + sq) * inv2) % p, ((-b - sq) * inv2) % p}
 		return
-	h = [1]
+	h, ring = [1], poly_barrett(g, p)
 	while len(h) in (1, len(g)):
-		h = gcmd(polysubmodp(polypowmodpmodpoly([randrange(p), 1], (p - 1) // 2, p, g), [1], p), g, p)
+		h = gcmd(polysubmodp(ring.pow([randrange(p), 1], (p - 1) // 2), [1], p), g, p)
 	q, s = polydivmodmodp(g, h, p)
 	assert s == []
-	yield from polyroots_prime(h, p, True)
-	yield from polyroots_prime(q, p, True)
+	yield from _polyroots_split(h, p)
+	yield from _polyroots_split(q, p)
 	return